@@ -1 +1 @@
-from ddd_common.application.decoratos import transactional, events, service, store_all_events
\ No newline at end of file
+from ddd_common.application.decoratos import transactional, events, service, store_all_events, decorated_methods
\ No newline at end of file
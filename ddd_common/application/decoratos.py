@@ -1,4 +1,5 @@
 import functools
+import inspect
 from ddd_common.domain.model import publisher, PublisherLifecycle
 
 
@@ -16,21 +17,64 @@ def service(func):
     return events(transactional(func))
 
 
+_decorated_methods = {}
+
+
+def decorated_methods(cls, marker):
+    """Names of the methods of cls marked with marker.
+
+    Computed once per class from the class dictionaries, so wrapping an
+    instance needs no dir() scan and never triggers properties.
+    """
+    key = (cls, marker)
+    names = _decorated_methods.get(key)
+
+    if names is None:
+        seen = set()
+        names = []
+
+        for klass in inspect.getmro(cls):
+            for name, value in vars(klass).iteritems():
+                if name in seen:
+                    continue
+                seen.add(name)
+
+                if hasattr(getattr(value, '__func__', value), marker):
+                    names.append(name)
+
+        names = _decorated_methods[key] = tuple(sorted(names))
+
+    return names
+
+
 def store_all_events(event_store, obj):
-    for key in dir(obj):
-        value = getattr(obj, key)
+    wrap_function = _store_events(event_store)
 
-        if callable(value) and hasattr(value, '__store_events__'):
-            setattr(obj, key, _store_events(event_store)(value))
+    for key in decorated_methods(obj.__class__, '__store_events__'):
+        setattr(obj, key, wrap_function(getattr(obj, key)))
     return obj
 
 
 def _store_events(event_store):
+    # Buffering stores write their events on flush and drop them on discard,
+    # other stores don't need to implement either.
+    flush = getattr(event_store, 'flush', None)
+    discard = getattr(event_store, 'discard', None)
+
     def wrap_function(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             with PublisherLifecycle(publisher(), EventStoreSubscriber(event_store)):
-                return func(*args, **kwargs)
+                try:
+                    return_value = func(*args, **kwargs)
+                except Exception:
+                    if discard is not None:
+                        discard()
+                    raise
+
+                if flush is not None:
+                    flush()
+                return return_value
 
         return wrapper
 
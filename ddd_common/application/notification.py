@@ -1,3 +1,4 @@
+import multiprocessing
 from ddd_common.application import service
 
 
@@ -7,4 +8,38 @@ class NotificationService(object):
 
     @service
     def publish_notifications(self):
-        self._notification_publisher.publish_notifications()
\ No newline at end of file
+        return self._notification_publisher.publish_notifications()
+
+    def drain_notifications(self):
+        """Publishes batches until the backlog is empty.
+
+        Every batch runs through the wrapped publish_notifications, so the
+        tracker is committed after each one.
+        """
+        published = 0
+
+        while True:
+            batch = self.publish_notifications()
+
+            if not batch:
+                return published
+
+            published += batch
+
+
+def run_publisher_shards(shard_count, publish_shard):
+    """Runs publish_shard((index, shard_count)) in its own process for every shard.
+
+    Every process has to open its own database session and broker
+    connection. Waits for all of them and returns their exit codes.
+    """
+    processes = [multiprocessing.Process(target=publish_shard, args=((index, shard_count),))
+                 for index in range(shard_count)]
+
+    for process in processes:
+        process.start()
+
+    for process in processes:
+        process.join()
+
+    return [process.exitcode for process in processes]
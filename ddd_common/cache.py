@@ -0,0 +1,55 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class LruCache(object):
+    """Thread-safe least recently used cache with an optional time to live.
+
+    Holds at most max_size entries; entries older than ttl seconds are
+    treated as missing.
+    """
+    def __init__(self, max_size=1000, ttl=None, clock=time.time):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, stored_at = self._entries.pop(key)
+            except KeyError:
+                return default
+
+            if self._ttl is not None and self._clock() - stored_at > self._ttl:
+                return default
+
+            self._entries[key] = (value, stored_at)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, self._clock())
+
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _missing) is not _missing
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_missing = object()
@@ -0,0 +1,109 @@
+from datetime import datetime, date
+from decimal import Decimal
+import simplejson
+from ddd_common.dates import format_datetime, format_date
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _json_default(microseconds=False, timezone=False):
+    def default(o):
+        if isinstance(o, datetime):
+            return format_datetime(o, microseconds, timezone)
+        elif isinstance(o, date):
+            return format_date(o)
+        elif hasattr(o, 'to_json'):
+            return o.to_json()
+        raise TypeError("Can't convert %r to json" % (
+            o.__class__ if o is not None else 'None'))
+
+    return default
+
+
+def _to_primitive(o, default):
+    if isinstance(o, dict):
+        return {key: _to_primitive(value, default) for key, value in o.iteritems()}
+    elif hasattr(o, '_asdict'):
+        return _to_primitive(o._asdict(), default)
+    elif isinstance(o, (list, tuple)):
+        return [_to_primitive(value, default) for value in o]
+    elif o is None or isinstance(o, (basestring, bool, int, long, float)):
+        return o
+    elif isinstance(o, Decimal):
+        return float(o)
+    return _to_primitive(default(o), default)
+
+
+class SimpleJsonCodec(object):
+    """JSON codec backed by simplejson.
+
+    Datetimes are written with microseconds and UTC offset only when asked
+    to; readers parse both forms.
+    """
+    content_type = 'application/json'
+
+    def __init__(self, name='json', microseconds=False, timezone=False):
+        self.name = name
+        self._default = _json_default(microseconds, timezone)
+
+    def dumps(self, data):
+        return simplejson.dumps(data, default=self._default)
+
+    def loads(self, text):
+        return simplejson.loads(text)
+
+
+class UJsonCodec(object):
+    """JSON codec backed by ujson.
+
+    Dates and nested to_json objects are converted in Python first, as ujson
+    has no default hook. Decimals are written as floats. Floats are written
+    with ujson's maximum of 15 significant decimals, so exact round trips
+    are not guaranteed and very small magnitudes round to 0; use the json
+    codec for events carrying such values.
+    """
+    content_type = 'application/json'
+
+    def __init__(self, name='ujson', microseconds=False, timezone=False):
+        self.name = name
+        self._default = _json_default(microseconds, timezone)
+
+    def dumps(self, data):
+        return ujson.dumps(_to_primitive(data, self._default), double_precision=15)
+
+    def loads(self, text):
+        return ujson.loads(text)
+
+
+_codecs = {}
+_default_codec_name = 'json'
+
+
+def register_codec(codec):
+    _codecs[codec.name] = codec
+
+
+def set_default_codec(name):
+    global _default_codec_name
+
+    get_codec(name)
+    _default_codec_name = name
+
+
+def get_codec(name=None):
+    """Returns the codec registered under name, the default codec for None."""
+    name = name if name is not None else _default_codec_name
+
+    try:
+        return _codecs[name]
+    except KeyError:
+        raise KeyError('Codec %r is not registered' % name)
+
+
+register_codec(SimpleJsonCodec())
+
+if ujson is not None:
+    register_codec(UJsonCodec())
@@ -0,0 +1,63 @@
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class ZlibCompression(object):
+    """zlib compression. Python 2 zlib has no preset dictionaries, use zstd for those."""
+    def __init__(self, name='zlib', level=6):
+        self.name = name
+        self._level = level
+
+    def compress(self, data):
+        return zlib.compress(data, self._level)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+class ZstdCompression(object):
+    """zstd compression, optionally with a dictionary trained on sample events.
+
+    Rows record the name of the compression they were written with, so
+    register every dictionary under its own name and keep old ones
+    registered while rows compressed with them exist.
+    """
+    def __init__(self, name='zstd', level=3, dictionary=None):
+        self.name = name
+        self._level = level
+        self._dictionary = dictionary
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=self._level, dict_data=self._dictionary).compress(data)
+
+    def decompress(self, data):
+        return zstandard.ZstdDecompressor(dict_data=self._dictionary).decompress(data)
+
+
+def train_zstd_dictionary(samples, size=16384):
+    """Trains a zstd dictionary on samples, serialized events of the kinds to be compressed."""
+    return zstandard.train_dictionary(size, samples)
+
+
+_compressions = {}
+
+
+def register_compression(compression):
+    _compressions[compression.name] = compression
+
+
+def get_compression(name):
+    try:
+        return _compressions[name]
+    except KeyError:
+        raise KeyError('Compression %r is not registered' % name)
+
+
+register_compression(ZlibCompression())
+
+if zstandard is not None:
+    register_compression(ZstdCompression())
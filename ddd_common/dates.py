@@ -0,0 +1,108 @@
+"""Fixed format date and datetime codec shared by serialization and readers.
+
+Datetimes are written as 'YYYY-MM-DD HH:MM:SS' and optionally carry
+microseconds ('.ffffff') and a UTC offset ('+HH:MM'). The parser accepts
+all of these variants as well as 'T' and 'Z', without going through
+strptime.
+"""
+from datetime import datetime, date, timedelta, tzinfo
+
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATE_FORMAT = '%Y-%m-%d'
+
+
+class FixedOffset(tzinfo):
+    def __init__(self, minutes):
+        self._minutes = minutes
+        self._offset = timedelta(minutes=minutes)
+
+    def utcoffset(self, dt):
+        return self._offset
+
+    def dst(self, dt):
+        return timedelta(0)
+
+    def tzname(self, dt):
+        return _format_offset(self._minutes)
+
+    def __reduce__(self):
+        return FixedOffset, (self._minutes,)
+
+    def __repr__(self):
+        return 'FixedOffset(%d)' % self._minutes
+
+
+UTC = FixedOffset(0)
+
+_offsets = {0: UTC}
+
+
+def _fixed_offset(minutes):
+    offset = _offsets.get(minutes)
+
+    if offset is None:
+        offset = _offsets[minutes] = FixedOffset(minutes)
+
+    return offset
+
+
+def _format_offset(minutes):
+    sign = '-' if minutes < 0 else '+'
+    hours, minutes = divmod(abs(minutes), 60)
+    return '%s%02d:%02d' % (sign, hours, minutes)
+
+
+def format_datetime(value, microseconds=False, timezone=False):
+    text = '%04d-%02d-%02d %02d:%02d:%02d' % (
+        value.year, value.month, value.day, value.hour, value.minute, value.second)
+
+    if microseconds:
+        text += '.%06d' % value.microsecond
+
+    if timezone:
+        offset = value.utcoffset()
+
+        if offset is not None:
+            text += _format_offset(offset.days * 1440 + offset.seconds // 60)
+
+    return text
+
+
+def format_date(value):
+    return '%04d-%02d-%02d' % (value.year, value.month, value.day)
+
+
+def parse_datetime(text):
+    if len(text) < 19 or text[4] != '-' or text[7] != '-' or text[10] not in ' T' \
+            or text[13] != ':' or text[16] != ':':
+        raise ValueError('Datetime %r does not match format %r' % (text, DATETIME_FORMAT))
+
+    microsecond = 0
+    tz = None
+    rest = text[19:]
+
+    if rest.startswith('.'):
+        end = 1
+        while end < len(rest) and rest[end].isdigit():
+            end += 1
+        microsecond = int(rest[1:end][:6].ljust(6, '0'))
+        rest = rest[end:]
+
+    if rest:
+        if rest == 'Z':
+            tz = UTC
+        elif rest[0] in '+-' and len(rest) in (5, 6):
+            minutes = int(rest[1:3]) * 60 + int(rest[-2:])
+            tz = _fixed_offset(-minutes if rest[0] == '-' else minutes)
+        else:
+            raise ValueError('Datetime %r has unsupported suffix %r' % (text, rest))
+
+    return datetime(int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                    int(text[11:13]), int(text[14:16]), int(text[17:19]), microsecond, tz)
+
+
+def parse_date(text):
+    if len(text) != 10 or text[4] != '-' or text[7] != '-':
+        raise ValueError('Date %r does not match format %r' % (text, DATE_FORMAT))
+
+    return date(int(text[0:4]), int(text[5:7]), int(text[8:10]))
@@ -1,4 +1,9 @@
-import threading
+import inspect
+
+try:
+    from gevent.local import local
+except ImportError:
+    from threading import local
 
 
 class Entity(object):
@@ -16,7 +21,77 @@ class Entity(object):
         #     '_initialize not implemented in entity %r' % self.__class__)
 
 
-_storage = threading.local()
+class EventSourcedEntity(Entity):
+    """Entity whose state is rebuilt by replaying the events it raised.
+
+    State changes go through _apply(event): the event is handed to the
+    entity's _when_<EventClassName> method, stamped with the entity's stream
+    id and stream version and published. Entities supporting snapshots
+    implement _snapshot_state and _restore_state.
+    """
+    def __init__(self, id, *args, **kwargs):
+        self._version = 0
+        self._snapshot_version = 0
+        super(EventSourcedEntity, self).__init__(id, *args, **kwargs)
+
+    @classmethod
+    def _reconstitute(cls, id, version=0, state=None):
+        entity = cls.__new__(cls)
+        entity._id = id
+        entity._version = version
+        entity._snapshot_version = version
+
+        if state is not None:
+            entity._restore_state(state)
+
+        return entity
+
+    @property
+    def version(self):
+        return self._version
+
+    @property
+    def stream_id(self):
+        return stream_id_of(self.id)
+
+    def _apply(self, event):
+        self._mutate(event)
+
+        event._stream_id = self.stream_id
+        event._stream_version = self._version
+
+        publisher().publish(event)
+
+    def _mutate(self, event):
+        name = '_when_%s' % event.__class__.__name__
+        handler = getattr(self, name, None)
+
+        if handler is None:
+            raise NotImplementedError('%s not implemented in entity %r' % (name, self.__class__))
+
+        handler(event)
+        self._version += 1
+
+    def _snapshot_state(self):
+        raise NotImplementedError('_snapshot_state not implemented in entity %r' % self.__class__)
+
+    def _restore_state(self, state):
+        raise NotImplementedError('_restore_state not implemented in entity %r' % self.__class__)
+
+
+def stream_id_of(id):
+    return unicode(id)
+
+
+# The current publisher is greenlet-local under gevent, so concurrent
+# requests served by one thread don't share or reset each other's subscribers.
+_storage = local()
+
+
+def set_publisher_storage(storage):
+    """Replaces the local storage holding the current publisher, e.g. with eventlet.corolocal.local()."""
+    global _storage
+    _storage = storage
 
 
 class PublisherLifecycle(object):
@@ -35,57 +110,79 @@ class PublisherLifecycle(object):
             raise
 
 
-def publisher():
-    class DomainEventPublisher(object):
-        def __init__(self):
-            self._publishing = False
+class DomainEventPublisher(object):
+    def __init__(self):
+        self._publishing = False
+        self._subscribers = []
+        self._handlers = {}
+
+    @property
+    def is_publishing(self):
+        return self._publishing
+
+    @property
+    def has_subscribers(self):
+        return self._subscribers is not None
+
+    def _ensure_subscribers_list(self):
+        if not self.has_subscribers:
             self._subscribers = []
 
-        @property
-        def is_publishing(self):
-            return self._publishing
+    def _handlers_of(self, event_type):
+        """Subscribers of event_type in subscription order, resolved once per event type.
 
-        @property
-        def has_subscribers(self):
-            return self._subscribers is not None
+        A subscriber matches when it subscribed to None, to event_type or to
+        one of its base classes.
+        """
+        handlers = self._handlers.get(event_type)
 
-        def _ensure_subscribers_list(self):
-            if not self.has_subscribers:
-                self._subscribers = []
+        if handlers is None:
+            handlers = self._handlers[event_type] = tuple(
+                subscriber for subscriber, subscribed_event_type in self._subscribers
+                if subscribed_event_type is None or subscribed_event_type == event_type
+                or (inspect.isclass(subscribed_event_type) and issubclass(event_type, subscribed_event_type))
+            )
 
-        def publish(self, event):
-            if not self.is_publishing and self.has_subscribers:
-                try:
-                    self._publishing = True
+        return handlers
 
-                    event_type = event.__class__
+    def publish(self, event):
+        if not self.is_publishing and self.has_subscribers:
+            try:
+                self._publishing = True
 
-                    for subscriber in self._subscribers:
-                        subscribed_event_type = subscriber.subscribed_event_type
+                for subscriber in self._handlers_of(event.__class__):
+                    subscriber.handle_event(event)
 
-                        is_subscribed = event_type == subscribed_event_type or subscribed_event_type is None
+            finally:
+                self._publishing = False
 
-                        if is_subscribed:
-                            subscriber.handle_event(event)
+    def publish_all(self, events):
+        if not self.is_publishing and self.has_subscribers:
+            try:
+                self._publishing = True
 
-                finally:
-                    self._publishing = False
+                handlers_of = self._handlers_of
+                for event in events:
+                    for subscriber in handlers_of(event.__class__):
+                        subscriber.handle_event(event)
 
-        def publish_all(self, events):
-            for event in events:
-                self.publish(event)
+            finally:
+                self._publishing = False
 
-        def reset(self):
-            if not self.is_publishing:
-                self._subscribers = []
+    def reset(self):
+        if not self.is_publishing:
+            self._subscribers = []
+            self._handlers = {}
 
-        def subscribe(self, subscriber):
-            if not self.is_publishing:
-                self._ensure_subscribers_list()
+    def subscribe(self, subscriber):
+        if not self.is_publishing:
+            self._ensure_subscribers_list()
 
-                self._subscribers.append(subscriber)
+            self._subscribers.append((subscriber, subscriber.subscribed_event_type))
+            self._handlers = {}
 
 
+def publisher():
     if not hasattr(_storage, 'instance'):
         setattr(_storage, 'instance', DomainEventPublisher())
 
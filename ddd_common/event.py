@@ -1,8 +1,9 @@
-from datetime import datetime, date
+from datetime import datetime
+import zlib
 from brownie.importing import import_string
-import simplejson
-
-DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+from ddd_common.codec import get_codec
+from ddd_common.compression import get_compression
+from ddd_common.dates import DATETIME_FORMAT, format_datetime, parse_datetime
 
 
 class JsonSerializableMixin(object):
@@ -11,11 +12,60 @@ class JsonSerializableMixin(object):
 
 
     def _serialize_datetime(self, value):
-        return value.strftime(DATETIME_FORMAT)
+        return format_datetime(value)
 
     @classmethod
     def _deserialize_datatime(cls, value):
-        return datetime.strptime(value, DATETIME_FORMAT)
+        return parse_datetime(value)
+
+
+class EventSchema(object):
+    """Names of the data attributes serialized by Event.to_json for one event class.
+
+    Fields come from ``__event_fields__`` when the class declares it.
+    Otherwise public non-callable class attributes (properties, constants,
+    ``__slots__``) are resolved once, and public instance attributes are
+    taken from the first instance and re-resolved only when an instance
+    carries a different set of them.
+    """
+    _schemas = {}
+
+    @classmethod
+    def of(cls, event_class):
+        schema = cls._schemas.get(event_class)
+
+        if schema is None:
+            schema = cls._schemas[event_class] = cls(event_class)
+
+        return schema
+
+    def __init__(self, event_class):
+        declared = getattr(event_class, '__event_fields__', None)
+
+        self._declared = tuple(declared) if declared is not None else None
+        self._class_fields = frozenset(key for key in dir(event_class)
+                                       if not key.startswith('_') and not callable(getattr(event_class, key)))
+        self._slots = frozenset(slot for klass in event_class.__mro__
+                                for slot in getattr(klass, '__slots__', ()))
+        self._inferred = (None, None)
+
+    @property
+    def slots(self):
+        return self._slots
+
+    def fields(self, event):
+        if self._declared is not None:
+            return self._declared
+
+        instance_keys, fields = self._inferred
+        keys = vars(event).viewkeys() if hasattr(event, '__dict__') else frozenset()
+
+        if keys != instance_keys:
+            instance_keys = frozenset(keys)
+            fields = tuple(sorted(self._class_fields.union(key for key in instance_keys if not key.startswith('_'))))
+            self._inferred = (instance_keys, fields)
+
+        return fields
 
 
 class Event(JsonSerializableMixin):
@@ -24,7 +74,16 @@ class Event(JsonSerializableMixin):
         self.occured_on = datetime.now()
 
     def to_json(self):
-        data = {key: getattr(self, key) for key in dir(self) if not key.startswith('_') and not callable(getattr(self, key))}
+        schema = EventSchema.of(self.__class__)
+
+        data = {}
+        for key in schema.fields(self):
+            if key in schema.slots and not hasattr(self, key):
+                continue
+
+            value = getattr(self, key)
+            if not callable(value):
+                data[key] = value
 
         child = self._to_json_child()
         if child:
@@ -34,6 +93,24 @@ class Event(JsonSerializableMixin):
     def _to_json_child(self):
         pass
 
+    @classmethod
+    def from_json(cls, data):
+        """Rebuilds an event from its to_json data when replaying an event stream.
+
+        Attributes are restored as decoded, occured_on is parsed back into
+        a datetime. Override it for other fields that need conversion.
+        """
+        event = cls.__new__(cls)
+
+        for key, value in data.iteritems():
+            try:
+                setattr(event, key, value)
+            except AttributeError:
+                pass
+
+        event.occured_on = parse_datetime(data['occured_on'])
+        return event
+
     def __repr__(self):
         return '%s(%s)' % (self.__class__, ', '.join(['%s=%s' % a for a in self.to_json().iteritems()]))
 
@@ -41,11 +118,38 @@ class Event(JsonSerializableMixin):
 
 
 class StoredEvent(object):
-    def __init__(self, type_name, occured_on, event, event_id=None):
+    def __init__(self, type_name, occured_on, event, event_id=None, codec=None,
+                 stream_id=None, stream_version=None, partition_hash=None,
+                 compressed_event=None, encoding=None):
         self._event_id = event_id
         self._type_name = type_name
         self._occured_on = occured_on
         self._event = event
+        self._compressed_event = compressed_event
+        self._encoding = encoding
+        self._codec = codec
+        self._stream_id = stream_id
+        self._stream_version = stream_version
+        self._partition_hash = partition_hash
+
+    @classmethod
+    def from_domain_event(cls, type_name, domain_event, codec, event_id=None, compression=None):
+        """Stored event of domain_event, its body compressed when compression names a registered compression."""
+        stream_id = getattr(domain_event, '_stream_id', None)
+        event = serialize_event(domain_event, codec)
+
+        stored_event = cls(type_name, domain_event.occured_on, event if compression is None else None,
+                           event_id=event_id, codec=codec,
+                           stream_id=stream_id,
+                           stream_version=getattr(domain_event, '_stream_version', None),
+                           partition_hash=partition_hash_of(partition_key_of(domain_event, type_name)))
+
+        if compression is not None:
+            stored_event._compressed_event = get_compression(compression).compress(event)
+            stored_event._encoding = compression
+            stored_event._decompressed_event = event
+
+        return stored_event
 
     @property
     def event_id(self):
@@ -61,22 +165,112 @@ class StoredEvent(object):
 
     @property
     def event(self):
+        """Serialized event, rows with a compressed body are decompressed once on first access."""
+        if self._event is None and self._compressed_event is not None:
+            event = getattr(self, '_decompressed_event', None)
+
+            if event is None:
+                event = self._decompressed_event = get_compression(self._encoding).decompress(self._compressed_event)
+
+            return event
+
         return self._event
 
+    @property
+    def compressed_event(self):
+        return self._compressed_event
+
+    @property
+    def encoding(self):
+        """Name of the compression of compressed_event, None for uncompressed rows."""
+        return self._encoding
+
+    @property
+    def codec(self):
+        """Name of the codec which serialized the event, rows written before codecs were recorded used json."""
+        return self._codec if self._codec is not None else 'json'
+
+    @property
+    def stream_id(self):
+        """Id of the event sourced aggregate which raised the event, if any."""
+        return self._stream_id
+
+    @property
+    def stream_version(self):
+        return self._stream_version
+
+    @property
+    def partition_hash(self):
+        """Stable hash of the event's partition key, see partition_key_of."""
+        return self._partition_hash
+
+    def partition(self, partition_count):
+        """Partition of the event among partition_count, rows stored without a hash fall into partition 0."""
+        return (self._partition_hash or 0) % partition_count
+
     def __repr__(self):
         return ("StoredEvent [eventBody=" + repr(self._event) + ", eventId=" + repr(self._event_id) + ", occurredOn=" + repr(self._occured_on) + ", typeName="
         + repr(self._type_name) + "]")
 
 
-def serialize_event(event):
-    def default(o):
-        if isinstance(o, datetime):
-            return o.strftime('%Y-%m-%d %H:%M:%S')
-        elif isinstance(o, date):
-            return o.strftime('%Y-%m-%d')
-        elif hasattr(o, 'to_json'):
-            return o.to_json()
-        raise TypeError("Can't convert %r to json" % (
-            o.__class__ if o is not None else 'None'))
+class Snapshot(object):
+    def __init__(self, stream_id, stream_version, type_name, state, codec=None):
+        self._stream_id = stream_id
+        self._stream_version = stream_version
+        self._type_name = type_name
+        self._state = state
+        self._codec = codec
+
+    @property
+    def stream_id(self):
+        return self._stream_id
+
+    @property
+    def stream_version(self):
+        return self._stream_version
+
+    @property
+    def type_name(self):
+        return self._type_name
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def codec(self):
+        return self._codec if self._codec is not None else 'json'
+
+    def __repr__(self):
+        return ("Snapshot [streamId=" + repr(self._stream_id) + ", streamVersion=" + repr(self._stream_version)
+        + ", typeName=" + repr(self._type_name) + "]")
+
+
+def serialize_event(event, codec=None):
+    return get_codec(codec).dumps(event.to_json())
+
+
+def partition_key_of(domain_event, type_name):
+    """Key keeping events of one aggregate in one partition.
+
+    That is the stream id of event sourced aggregates. Events of other
+    aggregates should carry the aggregate's id in a _partition_key
+    attribute, otherwise they are partitioned by type_name and events of
+    different types raised by one aggregate may be published out of order.
+    """
+    stream_id = getattr(domain_event, '_stream_id', None)
+    if stream_id is not None:
+        return stream_id
+
+    partition_key = getattr(domain_event, '_partition_key', None)
+    if partition_key is not None:
+        return unicode(partition_key)
+
+    return type_name
+
 
-    return simplejson.dumps(event.to_json(), default=default)
+def partition_hash_of(key):
+    """Non-negative crc32 of key, equal across processes unlike hash()."""
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+    return zlib.crc32(key) & 0x7fffffff
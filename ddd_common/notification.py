@@ -1,7 +1,7 @@
-from datetime import datetime
 from decimal import Decimal
-import simplejson
 from ddd_common import fullname
+from ddd_common.codec import get_codec
+from ddd_common.dates import parse_datetime, parse_date
 from ddd_common.event import JsonSerializableMixin, serialize_event
 
 
@@ -15,7 +15,7 @@ class Notification(JsonSerializableMixin):
 
     @classmethod
     def from_stored_event(cls, notification_id, stored_event):
-        reader = NotificationReader(stored_event.event)
+        reader = NotificationReader(stored_event.event, stored_event.codec)
 
         return Notification(
             notification_id, stored_event.event,
@@ -70,10 +70,54 @@ class PublishedNotificationTracker(object):
         +", typeName=" + self.type_name + "]")
 
 
+class ProcessedMessage(object):
+    """Record of a message a consumer has already handled, keyed by the message id."""
+    def __init__(self, consumer_name, message_id):
+        self._consumer_name = consumer_name
+        self._message_id = message_id
+
+    @property
+    def consumer_name(self):
+        return self._consumer_name
+
+    @property
+    def message_id(self):
+        return self._message_id
+
+    def __repr__(self):
+        return ("ProcessedMessage [consumerName=" + repr(self._consumer_name)
+        + ", messageId=" + repr(self._message_id) + "]")
+
+
+_key_paths = {}
+
+
+def _key_path(key):
+    """Splits a dotted key into its parent keys and the last key, once per key."""
+    path = _key_paths.get(key)
+
+    if path is None:
+        parts = key.split('.')
+        path = _key_paths[key] = (tuple(parts[:-1]), parts[-1])
+
+    return path
+
+
 class NotificationReader(object):
-    def __init__(self, json):
-        self._json = simplejson.loads(json) if isinstance(json, basestring) else json
-        self._event = self._json
+    def __init__(self, json, codec=None):
+        if isinstance(json, basestring):
+            self._text = json
+            self._codec = codec
+            self._parsed = None
+        else:
+            self._parsed = json
+
+    @property
+    def _json(self):
+        """The event document, decoded on first access."""
+        if self._parsed is None:
+            self._parsed = get_codec(self._codec).loads(self._text)
+        return self._parsed
 
     @property
     def version(self):
@@ -96,21 +140,26 @@ class NotificationReader(object):
         return self._json['type_name']
 
     def _get_value(self, key):
-        original_key = key
-        json = self._event
-        original_json = json
+        parents, last_key = _key_path(key)
+        json = self._json
 
         try:
-            while '.' in key:
-                parent, key = key.split('.', 1)
+            for parent in parents:
                 json = json[parent]
 
             if json is None:
-                raise KeyError('Item at %r is None' % original_key)
-            return json[key]
+                raise KeyError('Item at %r is None' % key)
+            return json[last_key]
         except KeyError:
             raise KeyError("Can't find %r in %r" % (key, json))
 
+    def extract(self, *fields):
+        """Returns typed values of (type, key) fields in the given order.
+
+        name, count = reader.extract(('string', 'name'), ('int', 'count'))
+        """
+        return [getattr(self, type)(key) for type, key in fields]
+
     def string(self, key):
         value = self._get_value(key)
 
@@ -123,14 +172,14 @@ class NotificationReader(object):
         return int(value)if value is not None else value
 
     def to_datetime(self, value):
-        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S') if value is not None else value
+        return parse_datetime(value) if value is not None else value
 
     def datetime(self, key):
         return self.to_datetime(self._get_value(key))
 
     def date(self, key):
         value = self._get_value(key)
-        return datetime.strptime(value, '%Y-%m-%d').date() if value is not None else value
+        return parse_date(value) if value is not None else value
 
     def bool(self, key):
         value = self._get_value(key)
@@ -0,0 +1,352 @@
+from multiprocessing.pool import ThreadPool
+import functools
+import logging
+import Queue
+import sys
+import time
+from ddd_common import fullname
+from ddd_common.cache import LruCache
+
+
+class ConcurrentDispatcher(object):
+    """Runs listener dispatches on a bounded thread pool.
+
+    Messages of finished dispatches are acked by complete(), which has to be
+    called from the connection thread. A dispatch may return a (succeeded,
+    failed) pair of its messages, then only the succeeded ones are acked and
+    the failed ones are handed to failed. With ordered=True every ordering
+    key is pinned to one single-threaded lane, so its messages are
+    dispatched in delivery order.
+    """
+    def __init__(self, max_workers, ordered=False, ack=None, failed=None):
+        self._ordered = ordered
+        self._ack = ack if ack is not None else _ack_each
+        self._failed = failed
+
+        if ordered:
+            self._lanes = [ThreadPool(1) for _ in range(max_workers)]
+        else:
+            self._lanes = [ThreadPool(max_workers)]
+
+        self._completed = Queue.Queue()
+
+    def submit(self, dispatch, messages, ordering_key=None):
+        lane = self._lanes[hash(ordering_key) % len(self._lanes)] if self._ordered else self._lanes[0]
+        lane.apply_async(self._run, (dispatch, messages))
+
+    def _run(self, dispatch, messages):
+        try:
+            outcome = dispatch()
+            succeeded, failed = outcome if outcome is not None else (messages, [])
+            self._completed.put((succeeded, failed, None))
+        except Exception, e:
+            logging.exception(e)
+            self._completed.put(([], messages, sys.exc_info()))
+
+    def complete(self):
+        """Acks messages of finished dispatches and re-raises the first failed one."""
+        while True:
+            try:
+                succeeded, failed, exc_info = self._completed.get_nowait()
+            except Queue.Empty:
+                return
+
+            if failed and self._failed is not None:
+                self._failed(failed)
+
+            if exc_info is not None:
+                raise exc_info[0], exc_info[1], exc_info[2]
+
+            if succeeded:
+                self._ack(succeeded)
+
+    def close(self):
+        for lane in self._lanes:
+            lane.close()
+        for lane in self._lanes:
+            lane.join()
+        self.complete()
+
+
+def _ack_each(messages):
+    for message in messages:
+        message.ack()
+
+
+class Acknowledger(object):
+    """Acks dispatched messages, a whole batch with a single multiple ack when that is safe.
+
+    A multiple ack acknowledges every delivery of the channel up to its tag,
+    so it is only sent when no other delivery before the batch's last tag
+    is still pending. Otherwise messages are acked one by one. Messages of
+    failed dispatches are requeued, so no later multiple ack covers them,
+    and forgotten; all channels are forgotten once the connection was
+    revived.
+    """
+    def __init__(self):
+        self._unacked = {}
+
+    def delivered(self, message):
+        self._unacked.setdefault(message.channel, set()).add(message.delivery_tag)
+
+    def failed(self, messages):
+        for message in messages:
+            unacked = self._unacked.get(message.channel)
+
+            if unacked is not None and message.delivery_tag in unacked:
+                unacked.discard(message.delivery_tag)
+                message.requeue()
+
+    def reset(self):
+        self._unacked = {}
+
+    def ack(self, messages):
+        by_channel = {}
+        for message in messages:
+            by_channel.setdefault(message.channel, []).append(message)
+
+        for channel, channel_messages in by_channel.iteritems():
+            unacked = self._unacked.setdefault(channel, set())
+            delivery_tags = set(message.delivery_tag for message in channel_messages)
+            last_delivery_tag = max(delivery_tags)
+
+            if len(delivery_tags) > 1 and all(delivery_tag in delivery_tags for delivery_tag in unacked
+                                              if delivery_tag <= last_delivery_tag):
+                channel.basic_ack(last_delivery_tag, multiple=True)
+            else:
+                _ack_each(channel_messages)
+
+            unacked.difference_update(delivery_tags)
+
+
+class BatchCollector(object):
+    """Collects deliveries per listener into batches of batch_size bodies.
+
+    A batch is handed out when full, or by expired() once its first
+    delivery waited batch_timeout seconds.
+    """
+    def __init__(self, batch_size, batch_timeout, clock=time.time):
+        self._batch_size = batch_size
+        self._batch_timeout = batch_timeout
+        self._clock = clock
+        self._batches = {}
+
+    def add(self, listener, body, message):
+        started, batch = self._batches.setdefault(listener, (self._clock(), []))
+        batch.append((body, message))
+
+        if len(batch) >= self._batch_size:
+            del self._batches[listener]
+            return batch
+
+    def expired(self):
+        now = self._clock()
+        expired = [(listener, batch) for listener, (started, batch) in self._batches.items()
+                   if now - started >= self._batch_timeout]
+
+        for listener, batch in expired:
+            del self._batches[listener]
+
+        return expired
+
+
+def dispatch_batch(listener, batch):
+    """Dispatches a batch of (body, message) deliveries at once.
+
+    When the batch fails every delivery is dispatched on its own through
+    dispatch_delivery. Returns the messages which were dispatched and the
+    ones which failed.
+    """
+    try:
+        listener.dispatch_batch([body for body, message in batch])
+        return [message for body, message in batch], []
+    except Exception, e:
+        logging.exception(e)
+
+    succeeded, failed = [], []
+    for body, message in batch:
+        try:
+            dispatch_delivery(listener, body, message)
+            succeeded.append(message)
+        except Exception, e:
+            logging.exception(e)
+            failed.append(message)
+
+    return succeeded, failed
+
+
+def dispatch_delivery(listener, body, message):
+    """Dispatches a delivered message, through dispatch_delivery for listeners deduplicating by message id."""
+    if hasattr(listener, 'dispatch_delivery'):
+        listener.dispatch_delivery(body, message)
+    else:
+        listener.dispatch(body)
+
+
+def message_id_of(message):
+    """Id the notification publisher put into the message headers, None when missing."""
+    message_id = (message.headers or {}).get('message_id')
+
+    if message_id is None:
+        message_id = message.properties.get('message_id')
+
+    return message_id
+
+
+class IdempotentListenerMixin(object):
+    """Mixin for listeners skipping messages they have already processed.
+
+    A message id is looked up in a bounded in-memory cache of recently
+    processed ids first, then in processed_message_store. Unseen messages
+    are marked processed before dispatch, so the mark is committed or rolled
+    back by the listener's own transaction; the store has to share the
+    session the listener commits. Messages without an id are always
+    dispatched.
+    """
+    # Number of recently processed message ids kept in memory.
+    _processed_message_cache_size = 10000
+
+    @property
+    def processed_message_store(self):
+        raise NotImplementedError('processed_message_store is not implemented in %r' % self.__class__)
+
+    @property
+    def consumer_name(self):
+        return fullname(self)
+
+    @property
+    def _processed_message_ids(self):
+        cache = self.__dict__.get('_processed_message_id_cache')
+
+        if cache is None:
+            cache = self.__dict__['_processed_message_id_cache'] = LruCache(self._processed_message_cache_size)
+
+        return cache
+
+    def dispatch_delivery(self, body, message):
+        message_id = message_id_of(message)
+
+        if message_id is None:
+            self.dispatch(body)
+            return
+
+        if self._processed_message_ids.get(message_id):
+            return
+
+        store = self.processed_message_store
+
+        if store.is_processed(self.consumer_name, message_id):
+            self._processed_message_ids.set(message_id, True)
+            return
+
+        store.mark_processed(self.consumer_name, message_id)
+        try:
+            self.dispatch(body)
+        except Exception:
+            store.discard_processed(self.consumer_name, message_id)
+            raise
+
+        self._processed_message_ids.set(message_id, True)
+
+
+class DispatchingConsumer(object):
+    """Dispatches deliveries of the consumers declared by a subclass to their listeners.
+
+    prefetch_count limits unacked deliveries per listener, listeners may
+    override it with their own prefetch_count attribute. With max_workers
+    dispatches run on a thread pool (ordered per listener and routing key
+    when ordered=True) and complete() has to be called from the connection
+    thread to ack finished messages. prefetch_count then defaults to
+    prefetch_per_worker deliveries (batches, with batch_size) per worker,
+    so the broker can't push the whole queue into the pool.
+
+    With batch_size, listeners implementing dispatch_batch(messages) get up
+    to batch_size messages at once, or fewer once the first one waited
+    batch_timeout seconds, acked together by a single multiple ack. When a
+    batch fails its messages are dispatched one by one, the failed ones are
+    requeued and the rest acked.
+
+    Listeners implementing dispatch_delivery(body, message), e.g. with
+    IdempotentListenerMixin, get the message too, also in the one by one
+    fallback of a failed batch.
+    """
+    prefetch_per_worker = 2
+
+    def __init__(self, listeners, prefetch_count=None, max_workers=None, ordered=False,
+                 batch_size=None, batch_timeout=0.1):
+        if prefetch_count is None and max_workers:
+            prefetch_count = max_workers * (batch_size or 1) * self.prefetch_per_worker
+
+        self._listeners = listeners
+        self._prefetch_count = prefetch_count
+        self._acknowledger = Acknowledger()
+        self._dispatcher = ConcurrentDispatcher(max_workers, ordered, self._acknowledger.ack,
+                                                self._acknowledger.failed) if max_workers else None
+        self._batches = BatchCollector(batch_size, batch_timeout) if batch_size else None
+
+    def _handle_delivery(self, listener, body, message):
+        self._acknowledger.delivered(message)
+
+        if self._batches is not None and hasattr(listener, 'dispatch_batch'):
+            batch = self._batches.add(listener, body, message)
+
+            if batch:
+                self._handle_batch(listener, batch)
+            return
+
+        if self._dispatcher is not None:
+            routing_key = message.delivery_info.get('routing_key')
+            self._dispatcher.submit(functools.partial(dispatch_delivery, listener, body, message), [message],
+                                    (id(listener), routing_key))
+            return
+
+        try:
+            dispatch_delivery(listener, body, message)
+            self._acknowledger.ack([message])
+        except Exception, e:
+            logging.exception(e)
+            self._acknowledger.failed([message])
+            raise
+
+    def _handle_batch(self, listener, batch):
+        if self._dispatcher is not None:
+            self._dispatcher.submit(functools.partial(dispatch_batch, listener, batch),
+                                    [message for body, message in batch], (id(listener), None))
+            return
+
+        succeeded, failed = dispatch_batch(listener, batch)
+
+        if failed:
+            self._acknowledger.failed(failed)
+        if succeeded:
+            self._acknowledger.ack(succeeded)
+
+    def complete(self):
+        if self._batches is not None:
+            for listener, batch in self._batches.expired():
+                self._handle_batch(listener, batch)
+
+        if self._dispatcher is not None:
+            self._dispatcher.complete()
+
+    def connection_revived(self):
+        """Forgets unacked deliveries of the channels closed with the previous connection."""
+        self._acknowledger.reset()
+
+    def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.close()
+
+
+class PrefetchConsumer(object):
+    """Mixin for kombu.Consumer setting its own prefetch limit right before it starts consuming.
+
+    basic.qos applies to consumers started after it on the channel, so each
+    listener's consumer gets its own limit even though they share a channel.
+    """
+    prefetch_count = None
+
+    def consume(self, no_ack=None):
+        if self.prefetch_count:
+            self.qos(prefetch_count=self.prefetch_count)
+        return super(PrefetchConsumer, self).consume(no_ack)
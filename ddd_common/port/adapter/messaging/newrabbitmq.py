@@ -1,7 +1,7 @@
 import functools
-import logging
 import kombu
 from ddd_common import fullname
+from ddd_common.port.adapter.messaging.dispatch import DispatchingConsumer, PrefetchConsumer
 
 
 class Exchange(object):
@@ -39,10 +39,18 @@ class Exchange(object):
         exchange.declare()
 
 
-class WorkerConsumer(object):
-    def __init__(self, listeners):
-        self._listeners = listeners
+class _Consumer(PrefetchConsumer, kombu.Consumer):
+    pass
 
+
+class WorkerConsumer(DispatchingConsumer):
+    """Declares a consumer per listener, see DispatchingConsumer for the dispatch options.
+
+    There is no Worker driving this consumer here. With max_workers or
+    batch_size the caller's consume loop has to call complete() regularly,
+    e.g. after every drain_events timeout, to ack finished messages and
+    hand out expired batches, and connection_revived() after reconnecting.
+    """
     def declare(self, channel, declare=True):
         consumers = []
         for listener in self._listeners:
@@ -59,21 +67,13 @@ class WorkerConsumer(object):
 
                 bindings.append(queue)
 
-            consumer = kombu.Consumer(channel, queues=bindings,
+            consumer = _Consumer(channel, queues=bindings,
                            callbacks=[functools.partial(self._handle_delivery, listener)])
+            consumer.prefetch_count = getattr(listener, 'prefetch_count', self._prefetch_count)
 
             consumers.append(consumer)
 
         return consumers
 
-    def _handle_delivery(self, listener, body, message):
-        try:
-            listener.dispatch(body)
-            message.ack()
-        except Exception, e:
-            logging.exception(e)
-            raise
-
-
     def consumers(self, channel):
         return self.declare(channel, declare=False)
\ No newline at end of file
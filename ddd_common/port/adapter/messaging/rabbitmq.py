@@ -1,10 +1,12 @@
 from time import mktime
 import functools
-import logging
+import threading
 import kombu
 from kombu.mixins import ConsumerMixin
 
 from ddd_common import fullname
+from ddd_common.port.adapter.messaging.dispatch import DispatchingConsumer, PrefetchConsumer
+from ddd_common.port.adapter.messaging.routing import routed_by_listens_to
 
 
 def to_timestamp(timestamp):
@@ -45,10 +47,12 @@ class Exchange(object):
         exchange.declare()
 
 
-class WorkerConsumer(object):
-    def __init__(self, listeners):
-        self._listeners = listeners
+class _Consumer(PrefetchConsumer, kombu.Consumer):
+    pass
 
+
+class WorkerConsumer(DispatchingConsumer):
+    """Declares a consumer per listener, see DispatchingConsumer for the dispatch options."""
     def declare(self, channel, declare=True):
         consumers = []
         for listener in self._listeners:
@@ -65,22 +69,14 @@ class WorkerConsumer(object):
 
                 bindings.append(queue)
 
-            consumer = kombu.Consumer(channel, queues=bindings,
+            consumer = _Consumer(channel, queues=bindings,
                            callbacks=[functools.partial(self._handle_delivery, listener)])
+            consumer.prefetch_count = getattr(listener, 'prefetch_count', self._prefetch_count)
 
             consumers.append(consumer)
 
         return consumers
 
-    def _handle_delivery(self, listener, body, message):
-        try:
-            listener.dispatch(body)
-            message.ack()
-        except Exception, e:
-            logging.exception(e)
-            raise
-
-
     def consumers(self, channel):
         return self.declare(channel, declare=False)
 
@@ -96,6 +92,7 @@ class ListenerMixin(object):
     def dispatch(self, message):
         pass
 
+    @routed_by_listens_to
     def can_dispatch(self, type_name):
         if self.listens_to == type_name:
             return True
@@ -125,6 +122,7 @@ class MqListener(object):
     def dispatch(self, message):
         raise NotImplementedError('dispatch is not implemented in %r' % self.__class__)
 
+    @routed_by_listens_to
     def can_dispatch(self, exchange, type_name):
         if self.exchange_name != exchange:
             return False
@@ -141,13 +139,26 @@ class MqListener(object):
 
 
 class Worker(ConsumerMixin):
-    def __init__(self, connection, worker_consumer):
+    def __init__(self, connection, worker_consumer, safety_interval=1):
         self.connection = connection
         self._worker_consumer = worker_consumer
+        self._safety_interval = safety_interval
 
     def get_consumers(self, Consumer, channel):
         return self._worker_consumer.consumers(channel)
 
+    def on_iteration(self):
+        self._worker_consumer.complete()
+
+    def on_connection_revived(self):
+        self._worker_consumer.connection_revived()
+
+    def consume(self, limit=None, timeout=None, safety_interval=None, **kwargs):
+        # A short safety interval lets a concurrent worker consumer ack
+        # finished messages soon after they complete.
+        safety_interval = safety_interval if safety_interval is not None else self._safety_interval
+        return super(Worker, self).consume(limit, timeout, safety_interval, **kwargs)
+
 
 class ConnectionFactory(object):
     def __enter__(self):
@@ -155,4 +166,64 @@ class ConnectionFactory(object):
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if exc_val:
-            raise
\ No newline at end of file
+            raise
+
+
+class PooledConnectionFactory(object):
+    """Drop-in replacement for ConnectionFactory backed by a kombu connection pool.
+
+    Connections stay open between uses, together with their default channel
+    and declared entities. Every acquired connection is health checked and
+    reconnected when broken; connections that failed with a connection or
+    channel error are collected before going back to the pool.
+    """
+    def __init__(self, hostname=None, limit=10, max_retries=3, acquire_timeout=None, **kwargs):
+        self._pool = kombu.Connection(hostname, **kwargs).Pool(limit=limit)
+        self._max_retries = max_retries
+        self._acquire_timeout = acquire_timeout
+        self._local = threading.local()
+
+    @property
+    def _acquired(self):
+        if not hasattr(self._local, 'connections'):
+            self._local.connections = []
+        return self._local.connections
+
+    def __enter__(self):
+        connection = self._pool.acquire(block=True, timeout=self._acquire_timeout)
+
+        try:
+            if not self._is_healthy(connection):
+                connection.collect()
+                connection.ensure_connection(max_retries=self._max_retries)
+        except Exception:
+            connection.release()
+            raise
+
+        self._acquired.append(connection)
+        return connection
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        connection = self._acquired.pop()
+
+        if isinstance(exc_val, connection.connection_errors + connection.channel_errors):
+            connection.collect()
+        connection.release()
+
+        if exc_val:
+            raise
+
+    def _is_healthy(self, connection):
+        if not connection.connected:
+            return False
+
+        if connection.heartbeat:
+            try:
+                connection.heartbeat_check()
+            except connection.connection_errors:
+                return False
+
+        return True
+
+    def close(self):
+        self._pool.force_close_all()
@@ -0,0 +1,55 @@
+def listener_type_names(listener):
+    """Type names a listener listens to, events in listens_to may be given by their type_name attribute."""
+    listens_to = listener.listens_to
+
+    if isinstance(listens_to, (list, tuple)):
+        return [getattr(event, 'type_name', event) for event in listens_to]
+
+    return [listens_to]
+
+
+def routed_by_listens_to(can_dispatch):
+    """Marks a can_dispatch implementation matching exactly the listener's exchange_name and listens_to."""
+    can_dispatch.routed_by_listens_to = True
+    return can_dispatch
+
+
+def _routed_by_listens_to(listener):
+    can_dispatch = getattr(listener, 'can_dispatch', None)
+    return can_dispatch is None or getattr(can_dispatch, 'routed_by_listens_to', False)
+
+
+class ListenerRouter(object):
+    """Listeners indexed by (exchange_name, type_name), in the order they were given.
+
+    Listeners overriding can_dispatch are not indexed, they are asked by
+    can_dispatch(exchange_name, type_name) on every dispatch. Built once
+    from the listeners; build a new router when they change.
+    """
+    def __init__(self, listeners):
+        self._routes = {}
+        self._dynamic = []
+
+        for position, listener in enumerate(listeners):
+            if not _routed_by_listens_to(listener):
+                self._dynamic.append((position, listener))
+                continue
+
+            for type_name in listener_type_names(listener):
+                routes = self._routes.setdefault((listener.exchange_name, type_name), [])
+
+                if not routes or routes[-1][1] is not listener:
+                    routes.append((position, listener))
+
+    def listeners_of(self, exchange_name, type_name):
+        routes = self._routes.get((exchange_name, type_name), [])
+
+        if self._dynamic:
+            routes = sorted(routes + [(position, listener) for position, listener in self._dynamic
+                                      if listener.can_dispatch(exchange_name, type_name)])
+
+        return [listener for position, listener in routes]
+
+    def dispatch(self, exchange_name, type_name, message):
+        for listener in self.listeners_of(exchange_name, type_name):
+            listener.dispatch(message)
@@ -1,28 +1,77 @@
+from itertools import islice
+import logging
+import socket
+import time
 from ddd_common.notification import Notification
 from ddd_common.port.adapter.messaging.rabbitmq import to_timestamp
 
 
+def shard_tracker_type_name(type_name, shard):
+    """Tracker type name of shard (index, count), each shard tracks its own progress."""
+    index, count = shard
+    return '%s.%d-of-%d' % (type_name, index, count)
+
+
 class RabbitMQNotificationPublisher(object):
-    def __init__(self, event_store, published_notification_tracker_store, exchange, connection_factory):
+    """Publishes stored events as notifications in event id order.
+
+    With shard=(index, count) only events of that partition are published,
+    partitioned by ddd_common.event.partition_key_of. Events of an
+    aggregate stay in order when they are event sourced or carry a
+    _partition_key; otherwise only events of one type keep their relative
+    order. Every shard needs its own
+    tracker, e.g. named by shard_tracker_type_name, and may run in its own
+    process.
+    """
+    def __init__(self, event_store, published_notification_tracker_store, exchange, connection_factory,
+                 batch_size=None, confirm_window=None, confirm_timeout=30, shard=None):
         self._event_store = event_store
         self._published_notification_tracker_store = published_notification_tracker_store
         self._exchange = exchange
         self._connection_factory = connection_factory
+        self._batch_size = batch_size
+        self._confirm_window = confirm_window
+        self._confirm_timeout = confirm_timeout
+        self._shard = shard
 
     def publish_notifications(self):
+        """Publishes at most batch_size unpublished notifications and tracks them.
+
+        Returns the number of published (in confirm mode, confirmed)
+        notifications, 0 once the backlog is empty.
+        """
+        started = time.time()
         notification_tracker = self._published_notification_tracker_store.published_notification_tracker()
 
         notifications = self._list_unpublished_notifications(notification_tracker.most_recent_published_notification_id)
 
-        with self._connection_factory as connection:
-            with connection.Producer(exchange=self._exchange.exchange(connection)) as producer:
-                for notification in notifications:
-                    self._publish(notification, producer)
+        if notifications:
+            with self._connection_factory as connection:
+                if self._confirm_window:
+                    notifications = self._publish_confirmed(connection, notifications)
+                else:
+                    with connection.Producer(exchange=self._exchange.exchange(connection)) as producer:
+                        for notification in notifications:
+                            self._publish(notification, producer)
 
-        self._published_notification_tracker_store.track_most_recent_published_notification(notification_tracker, notifications)
+        if notifications:
+            self._published_notification_tracker_store.track_most_recent_published_notification(notification_tracker, notifications)
+
+            self._report(notifications, time.time() - started)
+
+        return len(notifications)
 
     def _list_unpublished_notifications(self, most_recent_published_notification_id):
-        stored_events = self._event_store.all_stored_events_since(most_recent_published_notification_id)
+        kwargs = dict(partition=self._shard) if self._shard is not None else {}
+
+        if self._batch_size is None:
+            stored_events = self._event_store.all_stored_events_since(most_recent_published_notification_id, **kwargs)
+        else:
+            stored_events = islice(
+                self._event_store.stream_stored_events_since(most_recent_published_notification_id,
+                                                             chunk_size=self._batch_size, **kwargs),
+                self._batch_size
+            )
 
         notifications = self._notifications_from(stored_events)
 
@@ -34,6 +83,39 @@ class RabbitMQNotificationPublisher(object):
 
             yield notification
 
+    def _publish_confirmed(self, connection, notifications):
+        """Publishes windows of confirm_window notifications on a channel in confirm mode.
+
+        Confirms are awaited once per window. Returns the longest prefix of
+        notifications the broker confirmed, which is what may be tracked.
+        """
+        channel = connection.channel()
+
+        try:
+            confirms = PublisherConfirms(channel)
+            producer = connection.Producer(channel, exchange=self._exchange.exchange(channel))
+
+            for start in range(0, len(notifications), self._confirm_window):
+                for notification in notifications[start:start + self._confirm_window]:
+                    self._publish(notification, producer)
+                    confirms.published(notification)
+
+                confirms.wait(connection, self._confirm_timeout)
+
+                if not confirms.all_confirmed:
+                    logging.warning('Only %d of %d notifications were confirmed',
+                                    len(confirms.confirmed), len(notifications))
+                    break
+
+            return confirms.confirmed
+        finally:
+            channel.close()
+
+    def _report(self, notifications, elapsed):
+        logging.info('Published %d notifications %r..%r in %.3fs (%.1f/s)',
+                     len(notifications), notifications[0].notification_id, notifications[-1].notification_id,
+                     elapsed, len(notifications) / elapsed if elapsed else float('inf'))
+
     def _publish(self, notification, producer):
         headers = dict(
             message_id = str(notification.notification_id),
@@ -48,4 +130,72 @@ class RabbitMQNotificationPublisher(object):
             body=serialized_notification,
             headers=headers,
             content_type='application/json'
-        )
\ No newline at end of file
+        )
+
+
+class PublisherConfirms(object):
+    """Tracks publisher confirms of a freshly opened channel.
+
+    Delivery tags of a channel in confirm mode start at 1 and follow the
+    publish order, so the tag of a notification is its position in
+    the published list.
+    """
+    def __init__(self, channel):
+        self._published = []
+        self._confirmed = 0
+        self._resolved = 0
+        self._acks = {}
+
+        channel.confirm_select()
+        channel.events['basic_ack'].add(self._on_ack)
+        channel.events['basic_nack'].add(self._on_nack)
+
+    @property
+    def confirmed(self):
+        """Notifications up to the highest contiguously acked delivery tag."""
+        return self._published[:self._confirmed]
+
+    @property
+    def all_confirmed(self):
+        return self._confirmed == len(self._published)
+
+    @property
+    def all_resolved(self):
+        return self._resolved == len(self._published)
+
+    def published(self, notification):
+        self._published.append(notification)
+
+    def wait(self, connection, timeout, clock=time.time):
+        """Drains events until every publish is resolved or timeout seconds passed in total."""
+        deadline = clock() + timeout
+
+        try:
+            while not self.all_resolved:
+                remaining = deadline - clock()
+
+                if remaining <= 0:
+                    return
+
+                connection.drain_events(timeout=remaining)
+        except socket.timeout:
+            pass
+
+    def _on_ack(self, delivery_tag, multiple):
+        self._resolve(delivery_tag, multiple, True)
+
+    def _on_nack(self, delivery_tag, multiple, requeue):
+        self._resolve(delivery_tag, multiple, False)
+        return True
+
+    def _resolve(self, delivery_tag, multiple, acked):
+        delivery_tags = range(self._resolved + 1, delivery_tag + 1) if multiple else [delivery_tag]
+
+        for tag in delivery_tags:
+            self._acks.setdefault(tag, acked)
+
+        while self._resolved + 1 in self._acks:
+            self._resolved += 1
+
+        while self._acks.get(self._confirmed + 1):
+            self._confirmed += 1
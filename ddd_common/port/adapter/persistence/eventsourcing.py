@@ -0,0 +1,84 @@
+from ddd_common.codec import get_codec
+from ddd_common.domain.model import stream_id_of
+from ddd_common.event import Snapshot
+
+_event_classes = {}
+
+
+class EventSourcedRepository(object):
+    """Repository of EventSourcedEntity aggregates built on an event store.
+
+    An aggregate is loaded from its latest snapshot plus the events of its
+    stream after the snapshot version. When snapshot_every is set, save
+    stores a new snapshot once the aggregate moved that many versions past
+    the previous one, so load time stops growing with the stream length.
+    """
+    def __init__(self, event_store, snapshot_store=None, snapshot_every=None, codec=None):
+        if snapshot_every and snapshot_store is None:
+            raise ValueError('snapshot_every needs a snapshot_store in %r' % self.__class__)
+
+        self._event_store = event_store
+        self._snapshot_store = snapshot_store
+        self._snapshot_every = snapshot_every
+        self._codec = get_codec(codec).name
+
+    @property
+    def _entity_class(self):
+        raise NotImplementedError('_entity_class not specified for %r' % self.__class__)
+
+    @property
+    def _event_classes(self):
+        raise NotImplementedError('_event_classes not specified for %r' % self.__class__)
+
+    def _event_class_of(self, type_name):
+        event_classes = _event_classes.get(self.__class__)
+
+        if event_classes is None:
+            event_classes = {}
+            for event_class in self._event_classes:
+                event_classes[event_class.__module__ + '.' + event_class.__name__] = event_class
+                if isinstance(getattr(event_class, 'type_name', None), basestring):
+                    event_classes[event_class.type_name] = event_class
+            _event_classes[self.__class__] = event_classes
+
+        try:
+            return event_classes[type_name]
+        except KeyError:
+            raise KeyError('Event class of %r not specified for %r' % (type_name, self.__class__))
+
+    def _event_of(self, stored_event):
+        event_class = self._event_class_of(stored_event.type_name)
+        return event_class.from_json(get_codec(stored_event.codec).loads(stored_event.event))
+
+    def _object_of_id(self, id):
+        stream_id = stream_id_of(id)
+        entity = None
+
+        snapshot = self._snapshot_store.snapshot_of(stream_id) if self._snapshot_store is not None else None
+        if snapshot is not None:
+            state = get_codec(snapshot.codec).loads(snapshot.state)
+            entity = self._entity_class._reconstitute(id, snapshot.stream_version, state)
+
+        stored_events = self._event_store.stored_events_of_stream(
+            stream_id, snapshot.stream_version if snapshot is not None else 0)
+
+        for stored_event in stored_events:
+            if entity is None:
+                entity = self._entity_class._reconstitute(id)
+
+            entity._mutate(self._event_of(stored_event))
+            entity._version = stored_event.stream_version
+
+        return entity
+
+    def save(self, entity):
+        if self._snapshot_every and entity.version - entity._snapshot_version >= self._snapshot_every:
+            codec = get_codec(self._codec)
+            self._snapshot_store.save_snapshot(Snapshot(
+                entity.stream_id, entity.version, entity.__class__.__name__,
+                codec.dumps(entity._snapshot_state()), codec=codec.name
+            ))
+            entity._snapshot_version = entity.version
+
+    def add(self, entity):
+        self.save(entity)
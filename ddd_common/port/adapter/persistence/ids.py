@@ -0,0 +1,53 @@
+import threading
+import uuid
+
+
+class _BlockIdAllocator(object):
+    def __init__(self, block_size):
+        self._block_size = block_size
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def _block_of(self, sequence_value):
+        raise NotImplementedError('_block_of not implemented in %r' % self.__class__)
+
+    def next_id(self, session, sequence):
+        """Returns the next id of the current block, reserving a new block from sequence when it runs out."""
+        with self._lock:
+            next_id, limit = self._blocks.get(sequence.name, (None, None))
+
+            if next_id is None or next_id >= limit:
+                [sequence_value] = session.execute(sequence.next_value()).fetchone()
+                next_id, limit = self._block_of(sequence_value)
+
+            self._blocks[sequence.name] = (next_id + 1, limit)
+            return next_id
+
+
+class HiLoIdAllocator(_BlockIdAllocator):
+    """Reserves block_size ids per sequence value, ids are hi * block_size + lo.
+
+    Works with a plain sequence, but every writer of the table has to
+    allocate through hi-lo with the same block size.
+    """
+    def _block_of(self, sequence_value):
+        low = sequence_value * self._block_size
+        return low, low + self._block_size
+
+
+class PooledIdAllocator(_BlockIdAllocator):
+    """Reserves the ids between two values of a sequence created with INCREMENT BY block_size.
+
+    Ids stay compatible with writers taking plain values from the sequence.
+    """
+    def _block_of(self, sequence_value):
+        return sequence_value, sequence_value + self._block_size
+
+
+class UuidIdAllocator(object):
+    """Generates ids without touching the database."""
+    def __init__(self, factory=uuid.uuid4):
+        self._factory = factory
+
+    def next_id(self, session, sequence):
+        return str(self._factory())
@@ -1,7 +1,7 @@
 import sqlalchemy as sa
 import sqlalchemy.orm
-from ddd_common.event import StoredEvent
-from ddd_common.notification import PublishedNotificationTracker
+from ddd_common.event import StoredEvent, Snapshot
+from ddd_common.notification import PublishedNotificationTracker, ProcessedMessage
 
 metadata = sa.MetaData()
 
@@ -16,13 +16,46 @@ stored_events = sa.Table(
     sa.Column('event_body', sa.String),
     sa.Column('event_id', sa.Integer, primary_key=True),
     sa.Column('occured_on', sa.DateTime, nullable=False),
-    sa.Column('type_name', sa.String, nullable=False)
+    sa.Column('type_name', sa.String, nullable=False),
+    sa.Column('event_codec', sa.String),
+    sa.Column('stream_id', sa.String),
+    sa.Column('stream_version', sa.Integer),
+    sa.Column('partition_hash', sa.Integer),
+    sa.Column('event_body_compressed', sa.LargeBinary),
+    sa.Column('event_encoding', sa.String)
 )
+sa.Index('ix_stored_events_stream', stored_events.c.stream_id, stored_events.c.stream_version, unique=True)
+sa.Index('ix_stored_events_type_name', stored_events.c.type_name, stored_events.c.event_id)
+sa.Index('ix_stored_events_occured_on', stored_events.c.occured_on)
+
 sa.orm.mapper(StoredEvent, stored_events, properties={
     '_event_id': stored_events.c.event_id,
     '_type_name': stored_events.c.type_name,
     '_occured_on': stored_events.c.occured_on,
     '_event': stored_events.c.event_body,
+    '_codec': stored_events.c.event_codec,
+    '_stream_id': stored_events.c.stream_id,
+    '_stream_version': stored_events.c.stream_version,
+    '_partition_hash': stored_events.c.partition_hash,
+    '_compressed_event': stored_events.c.event_body_compressed,
+    '_encoding': stored_events.c.event_encoding,
+})
+
+snapshots = sa.Table(
+    'snapshots',
+    metadata,
+    sa.Column('stream_id', sa.String, primary_key=True),
+    sa.Column('stream_version', sa.Integer, nullable=False),
+    sa.Column('type_name', sa.String, nullable=False),
+    sa.Column('snapshot_body', sa.String, nullable=False),
+    sa.Column('snapshot_codec', sa.String)
+)
+sa.orm.mapper(Snapshot, snapshots, properties={
+    '_stream_id': snapshots.c.stream_id,
+    '_stream_version': snapshots.c.stream_version,
+    '_type_name': snapshots.c.type_name,
+    '_state': snapshots.c.snapshot_body,
+    '_codec': snapshots.c.snapshot_codec,
 })
 
 published_notification_tracker = sa.Table(
@@ -40,4 +73,16 @@ sa.orm.mapper(
        '_most_recent_published_notification_id':published_notification_tracker.c.most_recent_published_notification_id,
     },
     version_id_col=published_notification_tracker.c.concurrency_version
-)
\ No newline at end of file
+)
+
+processed_messages = sa.Table(
+    'processed_messages',
+    metadata,
+    sa.Column('consumer_name', sa.String, primary_key=True),
+    sa.Column('message_id', sa.String, primary_key=True)
+)
+
+sa.orm.mapper(ProcessedMessage, processed_messages, properties={
+    '_consumer_name': processed_messages.c.consumer_name,
+    '_message_id': processed_messages.c.message_id,
+})
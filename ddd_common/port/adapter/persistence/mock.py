@@ -1,30 +1,153 @@
+from bisect import bisect_left, bisect_right, insort
+import heapq
 from ddd_common import fullname
-from ddd_common.event import StoredEvent, serialize_event
+from ddd_common.codec import get_codec
+from ddd_common.event import StoredEvent
+from ddd_common.notification import PublishedNotificationTracker
 
 
 class MockEventStore(object):
-    def __init__(self):
+    """In-memory event store keeping stored events ordered by event id.
+
+    Id ranges are located with bisect, so reads cost O(log n) plus the
+    size of the result.
+    """
+    def __init__(self, codec=None):
+        self._codec = get_codec(codec).name
         self._stored_events = []
+        self._event_ids = []
+        self._streams = {}
+        self._types = {}
+        self._occurences = []
         self.events = []
         self.next_id = 1
 
+    def _range(self, low_stored_event_id, high_stored_event_id=None, including_low=False):
+        """Indexes of events with low < event_id <= high (low <= event_id with including_low), unbounded for None."""
+        if low_stored_event_id is None:
+            start = 0
+        elif including_low:
+            start = bisect_left(self._event_ids, low_stored_event_id)
+        else:
+            start = bisect_right(self._event_ids, low_stored_event_id)
+
+        stop = bisect_right(self._event_ids, high_stored_event_id) if high_stored_event_id is not None else len(self._event_ids)
+        return start, stop
+
     def all_stored_events_between(self, low_stored_event_id, high_stored_event_id):
-        return [a for a in self._stored_events if low_stored_event_id <= a.event_id <= high_stored_event_id]
+        start, stop = self._range(low_stored_event_id, high_stored_event_id, including_low=True)
+        return self._stored_events[start:stop]
+
+    def all_stored_events_since(self, low_stored_event_id, partition=None):
+        if partition is not None:
+            return list(self.stream_stored_events_since(low_stored_event_id, partition=partition))
+
+        start, stop = self._range(low_stored_event_id)
+        return self._stored_events[start:stop]
+
+    def stream_stored_events_between(self, low_stored_event_id, high_stored_event_id, chunk_size=1000):
+        start, stop = self._range(low_stored_event_id, high_stored_event_id, including_low=True)
+        return (self._stored_events[index] for index in xrange(start, stop))
+
+    def stream_stored_events_since(self, low_stored_event_id, chunk_size=1000, partition=None):
+        start, stop = self._range(low_stored_event_id)
+        stored_events = (self._stored_events[index] for index in xrange(start, stop))
+
+        if partition is not None:
+            index, count = partition
+            stored_events = (stored_event for stored_event in stored_events if stored_event.partition(count) == index)
 
-    def all_stored_events_since(self, low_stored_event_id):
-        return [a for a in self._stored_events if a.event_id > low_stored_event_id]
+        return stored_events
+
+    def all_stored_events_of_types_since(self, type_names, low_stored_event_id):
+        return list(self.stream_stored_events_of_types_since(type_names, low_stored_event_id))
+
+    def stream_stored_events_of_types_since(self, type_names, low_stored_event_id, chunk_size=1000):
+        """Events of type_names after low_stored_event_id, merged in id order from per type indexes."""
+        streams = []
+        for type_name in set(type_names):
+            event_ids, stored_events = self._types.get(type_name, ([], []))
+            start = bisect_right(event_ids, low_stored_event_id) if low_stored_event_id is not None else 0
+            streams.append(((stored_event.event_id, stored_event) for stored_event in stored_events[start:]))
+
+        return (stored_event for event_id, stored_event in heapq.merge(*streams))
+
+    def all_stored_events_occured_between(self, start, end):
+        low = bisect_left(self._occurences, (start,))
+        high = bisect_right(self._occurences, (end, float('inf')))
+        return [self._stored_events[index] for occured_on, event_id, index in self._occurences[low:high]]
+
+    def stored_events_of_stream(self, stream_id, after_stream_version=0):
+        stream = self._streams.get(stream_id, [])
+        return [a for a in stream if a.stream_version > after_stream_version]
 
     def append(self, domain_event):
         type_name = fullname(domain_event)
-        stored_event = StoredEvent(type_name, domain_event.occured_on,
-                                   serialize_event(domain_event), event_id=self.next_id)
+        stored_event = StoredEvent.from_domain_event(type_name, domain_event, self._codec, event_id=self.next_id)
         self.next_id += 1
         self._stored_events.append(stored_event)
+        self._event_ids.append(stored_event.event_id)
+
+        if stored_event.stream_id is not None:
+            self._streams.setdefault(stored_event.stream_id, []).append(stored_event)
+
+        event_ids, stored_events = self._types.setdefault(stored_event.type_name, ([], []))
+        event_ids.append(stored_event.event_id)
+        stored_events.append(stored_event)
+        insort(self._occurences, (stored_event.occured_on, stored_event.event_id, len(self._stored_events) - 1))
         self.events.append(domain_event)
 
 
+    def flush(self):
+        pass
+
+    def discard(self):
+        pass
+
     def close(self):
         pass
 
     def count_stored_events(self):
         return len(self._stored_events)
+
+
+class MockSnapshotStore(object):
+    def __init__(self):
+        self.snapshots = {}
+
+    def snapshot_of(self, stream_id):
+        return self.snapshots.get(stream_id)
+
+    def save_snapshot(self, snapshot):
+        self.snapshots[snapshot.stream_id] = snapshot
+        return snapshot
+
+
+class MockPublishedNotificationTrackerStore(object):
+    def __init__(self, type_name):
+        self._type_name = type_name
+        self._trackers = {}
+
+    def published_notification_tracker(self, type_name=None):
+        type_name = type_name if type_name is not None else self._type_name
+
+        return self._trackers.get(type_name, PublishedNotificationTracker(type_name))
+
+    def track_most_recent_published_notification(self, tracker, notifications):
+        if notifications:
+            tracker.set_most_recent_published_notification_id(notifications[-1].notification_id)
+            self._trackers[tracker.type_name] = tracker
+
+
+class MockProcessedMessageStore(object):
+    def __init__(self):
+        self.processed = set()
+
+    def is_processed(self, consumer_name, message_id):
+        return (consumer_name, message_id) in self.processed
+
+    def mark_processed(self, consumer_name, message_id):
+        self.processed.add((consumer_name, message_id))
+
+    def discard_processed(self, consumer_name, message_id):
+        self.processed.discard((consumer_name, message_id))
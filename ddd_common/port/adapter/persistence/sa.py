@@ -1,16 +1,85 @@
 import functools
 from ddd_common import fullname
-from ddd_common.application import store_all_events
-from ddd_common.event import StoredEvent, serialize_event
-from ddd_common.notification import PublishedNotificationTracker
+from ddd_common.application import store_all_events, decorated_methods
+from ddd_common.codec import get_codec
+from ddd_common.compression import get_compression
+from ddd_common.event import StoredEvent, Snapshot
+from ddd_common.notification import PublishedNotificationTracker, ProcessedMessage
 from ddd_common.port.adapter.persistence import mapping
 import sqlalchemy as sa
+import sqlalchemy.orm
+
+
+def _detached_copy(obj):
+    """Copy of the loaded column attributes of obj, detached from any session."""
+    state = sa.inspect(obj)
+    mapper = state.mapper
+
+    copy = mapper.class_manager.new_instance()
+    for prop in mapper.column_attrs:
+        if prop.key in state.dict:
+            sa.orm.attributes.set_committed_value(copy, prop.key, state.dict[prop.key])
+
+    sa.orm.make_transient_to_detached(copy)
+    return copy
+
+
+def _watch_cache(session, entity_class, cache):
+    """Invalidates cached entity_class objects once a transaction of session changing them commits."""
+    if isinstance(session, sa.orm.scoped_session):
+        # Listening on a scoped_session would listen on its whole sessionmaker.
+        session = session()
+
+    caches = session.info.get('ddd_common.caches')
+
+    if caches is None:
+        caches = session.info['ddd_common.caches'] = {}
+        session.info['ddd_common.stale'] = set()
+
+        sa.event.listen(session, 'after_flush', _collect_stale_objects)
+        sa.event.listen(session, 'after_commit', _invalidate_stale_objects)
+
+    caches[entity_class] = cache
+
+
+def _collect_stale_objects(session, flush_context):
+    stale = session.info.get('ddd_common.stale')
+    if stale is None:
+        return
+
+    for obj in list(session.dirty) + list(session.deleted):
+        for entity_class, cache in session.info['ddd_common.caches'].iteritems():
+            if isinstance(obj, entity_class):
+                stale.add((cache, obj.id))
+
+
+def _invalidate_stale_objects(session):
+    stale = session.info.get('ddd_common.stale')
+    if stale is None:
+        return
+
+    for cache, id in stale:
+        cache.invalidate(id)
+    stale.clear()
 
 
 class SaRepository(object):
+    # Opt-in read-through cache shared by all instances of a repository
+    # class, e.g. ddd_common.cache.LruCache(max_size=1000, ttl=60).
+    # Objects flushed as changed or deleted are invalidated on commit.
+    _cache = None
+    # Optional allocator from ddd_common.port.adapter.persistence.ids
+    # handing out ids without a sequence round trip per entity.
+    _id_allocator = None
+    # Largest number of ids bound into one IN query by _objects_of_ids.
+    _max_ids_per_query = 500
+
     def __init__(self, session):
         self._session = session
 
+        if self._cache is not None:
+            _watch_cache(session, self._entity_class, self._cache)
+
     @property
     def _entity_class(self):
         raise NotImplementedError('_entity_class not specified for %r' % self.__class__)
@@ -23,8 +92,56 @@ class SaRepository(object):
     def _query(self):
         return self._session.query(self._entity_class)
 
+    def _loaded_object(self, id):
+        """Object of id from the session identity map or the cache, without a query."""
+        obj = self._session.identity_map.get(sa.orm.util.identity_key(self._entity_class, id))
+
+        if obj is None and self._cache is not None:
+            cached = self._cache.get(id)
+            if cached is not None:
+                obj = self._session.merge(cached, load=False)
+
+        return obj
+
+    def _cache_object(self, obj):
+        if obj is not None and self._cache is not None:
+            self._cache.set(obj.id, _detached_copy(obj))
+
     def _object_of_id(self, id):
-        return self._query.filter(self._table.c.id == id).first()
+        """Looks id up in the session identity map, then in the cache and only then in the database."""
+        obj = self._loaded_object(id)
+
+        if obj is None:
+            obj = self._query.get(id)
+            self._cache_object(obj)
+
+        return obj
+
+    def _objects_of_ids(self, ids):
+        """Objects of ids in request order, None for ids which don't exist.
+
+        Objects already in the identity map or the cache are used as they
+        are, the rest is loaded by IN queries of at most _max_ids_per_query ids.
+        """
+        objects = {}
+        missing_ids = []
+
+        for id in ids:
+            if id in objects:
+                continue
+
+            objects[id] = obj = self._loaded_object(id)
+            if obj is None:
+                missing_ids.append(id)
+
+        for start in range(0, len(missing_ids), self._max_ids_per_query):
+            chunk = missing_ids[start:start + self._max_ids_per_query]
+
+            for obj in self._query.filter(self._table.c.id.in_(chunk)):
+                objects[obj.id] = obj
+                self._cache_object(obj)
+
+        return [objects[id] for id in ids]
 
     def save(self, obj):
         self._session.add(obj)
@@ -33,15 +150,22 @@ class SaRepository(object):
         self.save(obj)
 
     def next_id(self):
+        if self._id_allocator is not None:
+            return self._id_allocator.next_id(self._session, self._table.c.id.default)
+
         sequence = self._table.c.id.default.next_value()
         [next_id] = self._session.execute(sequence).fetchone()
         return next_id
 
 
 class SaEventStore(object):
-    def __init__(self, session, testing=False):
+    def __init__(self, session, testing=False, buffered=False, codec=None, compression=None):
         self._session = session
         self._testing = testing
+        self._buffered = buffered
+        self._codec = get_codec(codec).name
+        self._compression = get_compression(compression).name if compression is not None else None
+        self._pending_events = []
 
         if testing:
             self.events = []
@@ -59,26 +183,161 @@ class SaEventStore(object):
 
         return query.all()
 
-    def all_stored_events_since(self, low_stored_event_id):
+    def _partition_criterion(self, partition):
+        """Criterion selecting the events of partition (index, count), None selects all of them."""
+        if partition is None:
+            return None
+
+        index, count = partition
+        return sa.func.coalesce(mapping.stored_events.c.partition_hash, 0) % count == index
+
+    def all_stored_events_since(self, low_stored_event_id, partition=None):
         query = self._query
 
         if low_stored_event_id is not None:
             query = query.filter(mapping.stored_events.c.event_id>low_stored_event_id)
 
+        partition_criterion = self._partition_criterion(partition)
+        if partition_criterion is not None:
+            query = query.filter(partition_criterion)
+
+        query = query.order_by(sa.asc(mapping.stored_events.c.event_id))
+
+        return query.all()
+
+    def stream_stored_events_between(self, low_stored_event_id, high_stored_event_id, chunk_size=1000):
+        return self._stream_stored_events(
+            mapping.stored_events.c.event_id.between(low_stored_event_id, high_stored_event_id),
+            chunk_size
+        )
+
+    def stream_stored_events_since(self, low_stored_event_id, chunk_size=1000, partition=None):
+        criterion = self._partition_criterion(partition)
+
+        if low_stored_event_id is not None:
+            since = mapping.stored_events.c.event_id>low_stored_event_id
+            criterion = since if criterion is None else sa.and_(since, criterion)
+
+        return self._stream_stored_events(criterion, chunk_size)
+
+    def _types_since_criterion(self, type_names, low_stored_event_id):
+        criterion = mapping.stored_events.c.type_name.in_(list(type_names))
+
+        if low_stored_event_id is not None:
+            criterion = sa.and_(criterion, mapping.stored_events.c.event_id>low_stored_event_id)
+
+        return criterion
+
+    def all_stored_events_of_types_since(self, type_names, low_stored_event_id):
+        """Events of type_names after low_stored_event_id in id order, read through the type name index."""
+        query = self._query.filter(self._types_since_criterion(type_names, low_stored_event_id))
         query = query.order_by(sa.asc(mapping.stored_events.c.event_id))
 
         return query.all()
 
+    def stream_stored_events_of_types_since(self, type_names, low_stored_event_id, chunk_size=1000):
+        return self._stream_stored_events(self._types_since_criterion(type_names, low_stored_event_id), chunk_size)
+
+    def all_stored_events_occured_between(self, start, end):
+        """Events with start <= occured_on <= end ordered by occured_on, then id."""
+        occured_on = mapping.stored_events.c.occured_on
+
+        query = self._query.filter(occured_on.between(start, end))
+        query = query.order_by(sa.asc(occured_on), sa.asc(mapping.stored_events.c.event_id))
+
+        return query.all()
+
+    def _stream_stored_events(self, criterion, chunk_size):
+        """Yields stored events ordered by id, loading at most chunk_size rows at a time.
+
+        Pages are selected by the last seen event id (keyset pagination), so
+        every chunk is an indexed range scan regardless of how far in we are.
+        """
+        event_id = mapping.stored_events.c.event_id
+        last_event_id = None
+
+        while True:
+            query = self._query
+
+            if criterion is not None:
+                query = query.filter(criterion)
+
+            if last_event_id is not None:
+                query = query.filter(event_id>last_event_id)
+
+            chunk = query.order_by(sa.asc(event_id)).limit(chunk_size).all()
+
+            for stored_event in chunk:
+                yield stored_event
+
+            if len(chunk) < chunk_size:
+                return
+
+            last_event_id = chunk[-1].event_id
+
+    def stored_events_of_stream(self, stream_id, after_stream_version=0):
+        stream_version = mapping.stored_events.c.stream_version
+
+        query = self._query.filter(
+            mapping.stored_events.c.stream_id==stream_id,
+            stream_version>after_stream_version
+        )
+        query = query.order_by(sa.asc(stream_version))
+
+        return query.all()
+
     def append(self, domain_event):
         if self._testing:
             self.events.append(domain_event)
         type_name = domain_event.type_name
-        stored_event = StoredEvent(type_name, domain_event.occured_on, serialize_event(domain_event))
-        self._session.add(stored_event)
-        self._session.flush()
+        stored_event = StoredEvent.from_domain_event(type_name, domain_event, self._codec,
+                                                     compression=self._compression)
+
+        if self._buffered:
+            self._pending_events.append(stored_event)
+        else:
+            self._session.add(stored_event)
+            self._session.flush()
 
         return stored_event
 
+    def flush(self):
+        """Writes buffered events with a single multi-row insert.
+
+        Event ids are assigned in append order. Backends without multi-row
+        ``RETURNING`` fall back to one core insert per event.
+        """
+        if not self._pending_events:
+            return
+
+        stored_events, self._pending_events = self._pending_events, []
+
+        table = mapping.stored_events
+        rows = [dict(type_name=stored_event.type_name,
+                     occured_on=stored_event.occured_on,
+                     event_body=stored_event.event if stored_event.encoding is None else None,
+                     event_body_compressed=stored_event.compressed_event,
+                     event_encoding=stored_event.encoding,
+                     event_codec=stored_event.codec,
+                     stream_id=stored_event.stream_id,
+                     stream_version=stored_event.stream_version,
+                     partition_hash=stored_event.partition_hash)
+                for stored_event in stored_events]
+
+        dialect = self._session.get_bind().dialect
+        if dialect.implicit_returning and dialect.supports_multivalues_insert:
+            insert = table.insert().values(rows).returning(table.c.event_id)
+            event_ids = sorted(event_id for [event_id] in self._session.execute(insert))
+        else:
+            event_ids = [self._session.execute(table.insert(), row).inserted_primary_key[0]
+                         for row in rows]
+
+        for stored_event, event_id in zip(stored_events, event_ids):
+            stored_event._event_id = event_id
+
+    def discard(self):
+        self._pending_events = []
+
     def close(self):
         pass
 
@@ -86,6 +345,17 @@ class SaEventStore(object):
         return self._query.count()
 
 
+class SaSnapshotStore(object):
+    def __init__(self, session):
+        self._session = session
+
+    def snapshot_of(self, stream_id):
+        return self._session.query(Snapshot).get(stream_id)
+
+    def save_snapshot(self, snapshot):
+        return self._session.merge(snapshot)
+
+
 class SaPublishedNotificationTrackerStore(object):
     def __init__(self, session, type_name):
         self._session = session
@@ -115,6 +385,36 @@ class SaPublishedNotificationTrackerStore(object):
             self._session.add(tracker)
 
 
+class SaProcessedMessageStore(object):
+    """Processed message ids of idempotent consumers.
+
+    Marks are added to the session, so they are committed or rolled back
+    together with the listener's own changes. Lookups hit the primary key.
+    """
+    def __init__(self, session):
+        self._session = session
+
+    def is_processed(self, consumer_name, message_id):
+        return self._session.query(ProcessedMessage).get((consumer_name, message_id)) is not None
+
+    def mark_processed(self, consumer_name, message_id):
+        self._session.add(ProcessedMessage(consumer_name, message_id))
+
+    def discard_processed(self, consumer_name, message_id):
+        """Drops a mark of a failed dispatch, whether it is still pending or was already autoflushed."""
+        for processed in list(self._session.new):
+            if isinstance(processed, ProcessedMessage) and \
+                    (processed.consumer_name, processed.message_id) == (consumer_name, message_id):
+                self._session.expunge(processed)
+                return
+
+        table = mapping.processed_messages
+        self._session.query(ProcessedMessage).filter(
+            table.c.consumer_name==consumer_name,
+            table.c.message_id==message_id
+        ).delete(synchronize_session='fetch')
+
+
 def wrap_function_in_transaction(session):
     def wrap_function(func):
         @functools.wraps(func)
@@ -132,11 +432,10 @@ def wrap_function_in_transaction(session):
 
 
 def wrap_object_in_transaction(session, obj):
-    for key in dir(obj):
-        value = getattr(obj, key)
+    wrap_function = wrap_function_in_transaction(session)
 
-        if callable(value) and hasattr(value, '__transactional__'):
-            setattr(obj, key, wrap_function_in_transaction(session)(value))
+    for key in decorated_methods(obj.__class__, '__transactional__'):
+        setattr(obj, key, wrap_function(getattr(obj, key)))
 
     return obj
 
@@ -0,0 +1,273 @@
+from bisect import bisect_right
+import mmap
+import os
+import struct
+import threading
+import zlib
+import simplejson
+from ddd_common.codec import get_codec
+from ddd_common.dates import format_datetime, parse_datetime
+from ddd_common.event import StoredEvent
+
+# Record header: payload length, crc32 of the payload and event id.
+_HEADER = struct.Struct('>IIQ')
+_SUFFIX = '.segment'
+
+
+class CorruptSegmentError(Exception):
+    pass
+
+
+class _Segment(object):
+    """One segment file holding the records of consecutive event ids from first_event_id.
+
+    Every index_interval-th record is remembered in a sparse event id to
+    offset index, so a read starts scanning close to the wanted id.
+    """
+    def __init__(self, path, first_event_id):
+        self.path = path
+        self.first_event_id = first_event_id
+        self.size = 0
+        self.count = 0
+        self.index_event_ids = []
+        self.index_offsets = []
+        self._view = None
+
+    def indexed(self, event_id, offset, index_interval):
+        if self.count % index_interval == 0:
+            self.index_event_ids.append(event_id)
+            self.index_offsets.append(offset)
+
+        self.count += 1
+
+    def offset_of(self, event_id):
+        """Offset to start scanning at for records from event_id on."""
+        position = bisect_right(self.index_event_ids, event_id) - 1
+        return self.index_offsets[position] if position >= 0 else 0
+
+    def view(self):
+        """Read-only memory map of the written part of the segment, remapped after it grew."""
+        if self._view is None or len(self._view) != self.size:
+            with open(self.path, 'rb') as f:
+                self._view = mmap.mmap(f.fileno(), self.size, access=mmap.ACCESS_READ)
+
+        return self._view
+
+    def close(self):
+        if self._view is not None:
+            self._view.close()
+            self._view = None
+
+
+def _records(view, offset, end):
+    """Yields (offset, event id, payload) of the intact records in view[offset:end]."""
+    while offset + _HEADER.size <= end:
+        length, crc, event_id = _HEADER.unpack_from(view, offset)
+        start = offset + _HEADER.size
+
+        if start + length > end:
+            return
+
+        payload = view[start:start + length]
+        if zlib.crc32(payload) & 0xffffffff != crc:
+            return
+
+        yield offset, event_id, payload
+        offset = start + length
+
+
+class SegmentEventStore(object):
+    """Event store appending length-prefixed records to rolling segment files in directory.
+
+    A segment is rolled once it would outgrow segment_size. The sparse
+    index of every segment is rebuilt by scanning the files on open, a
+    torn record at the end of the last segment is truncated while damage
+    anywhere else raises CorruptSegmentError. Reads go through memory maps
+    of the segments.
+
+    Like SaEventStore, events are written on append unless buffered, then
+    on flush. Written files are fsynced every fsync_every writes; None
+    leaves syncing to the operating system.
+    """
+    def __init__(self, directory, segment_size=64 * 1024 * 1024, index_interval=64,
+                 buffered=False, fsync_every=1, codec=None):
+        self._directory = directory
+        self._segment_size = segment_size
+        self._index_interval = index_interval
+        self._buffered = buffered
+        self._fsync_every = fsync_every
+        self._codec = get_codec(codec).name
+        self._pending_events = []
+        self._unsynced_writes = 0
+        self._lock = threading.RLock()
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self._segments = []
+        self._first_event_ids = []
+        self._open_segments()
+        self._file = open(self._segments[-1].path, 'ab')
+
+    def _open_segments(self):
+        first_event_ids = sorted(int(name[:-len(_SUFFIX)]) for name in os.listdir(self._directory)
+                                 if name.endswith(_SUFFIX))
+
+        for first_event_id in first_event_ids:
+            segment = self._add_segment(first_event_id)
+            file_size = os.path.getsize(segment.path)
+
+            if file_size:
+                with open(segment.path, 'rb') as f:
+                    view = mmap.mmap(f.fileno(), file_size, access=mmap.ACCESS_READ)
+                    try:
+                        for offset, event_id, payload in _records(view, 0, file_size):
+                            segment.indexed(event_id, offset, self._index_interval)
+                            segment.size = offset + _HEADER.size + len(payload)
+                    finally:
+                        view.close()
+
+            if segment.size != file_size:
+                if first_event_id != first_event_ids[-1]:
+                    raise CorruptSegmentError('Segment %s is corrupt at offset %d' % (segment.path, segment.size))
+
+                with open(segment.path, 'r+b') as f:
+                    f.truncate(segment.size)
+
+        if not self._segments:
+            self._add_segment(1)
+
+        last = self._segments[-1]
+        self._next_event_id = last.first_event_id + last.count
+
+    def _add_segment(self, first_event_id):
+        path = os.path.join(self._directory, '%020d%s' % (first_event_id, _SUFFIX))
+        if not os.path.exists(path):
+            open(path, 'ab').close()
+
+        segment = _Segment(path, first_event_id)
+        self._segments.append(segment)
+        self._first_event_ids.append(first_event_id)
+        return segment
+
+    def _roll(self):
+        self._sync()
+        self._file.close()
+
+        self._file = open(self._add_segment(self._next_event_id).path, 'ab')
+
+    def _sync(self):
+        if self._unsynced_writes:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced_writes = 0
+
+    def _encode(self, stored_event):
+        return simplejson.dumps([
+            stored_event.type_name, format_datetime(stored_event.occured_on, microseconds=True),
+            stored_event.event, stored_event.codec, stored_event.stream_id, stored_event.stream_version,
+            stored_event.partition_hash
+        ])
+
+    def _decode(self, event_id, payload):
+        type_name, occured_on, event, codec, stream_id, stream_version, partition_hash = simplejson.loads(payload)
+
+        return StoredEvent(type_name, parse_datetime(occured_on), event, event_id=event_id, codec=codec,
+                           stream_id=stream_id, stream_version=stream_version, partition_hash=partition_hash)
+
+    def _write(self, stored_events):
+        with self._lock:
+            for stored_event in stored_events:
+                payload = self._encode(stored_event)
+                record = _HEADER.pack(len(payload), zlib.crc32(payload) & 0xffffffff, self._next_event_id) + payload
+
+                segment = self._segments[-1]
+                if segment.count and segment.size + len(record) > self._segment_size:
+                    self._roll()
+                    segment = self._segments[-1]
+
+                self._file.write(record)
+                segment.indexed(self._next_event_id, segment.size, self._index_interval)
+                segment.size += len(record)
+
+                stored_event._event_id = self._next_event_id
+                self._next_event_id += 1
+
+            self._file.flush()
+            self._unsynced_writes += 1
+
+            if self._fsync_every and self._unsynced_writes >= self._fsync_every:
+                self._sync()
+
+    def _stored_events(self, low_stored_event_id, high_stored_event_id=None, including_low=False):
+        """Yields stored events with low < event_id <= high (low <= event_id with including_low), unbounded for None."""
+        if low_stored_event_id is None:
+            first_event_id = 1
+        else:
+            first_event_id = low_stored_event_id if including_low else low_stored_event_id + 1
+
+        with self._lock:
+            position = max(bisect_right(self._first_event_ids, first_event_id) - 1, 0)
+            ranges = [(segment.view(), segment.offset_of(first_event_id), segment.size)
+                      for segment in self._segments[position:] if segment.size]
+
+        for view, offset, end in ranges:
+            for offset, event_id, payload in _records(view, offset, end):
+                if event_id < first_event_id:
+                    continue
+
+                if high_stored_event_id is not None and event_id > high_stored_event_id:
+                    return
+
+                yield self._decode(event_id, payload)
+
+    def _in_partition(self, stored_events, partition):
+        if partition is None:
+            return stored_events
+
+        index, count = partition
+        return (stored_event for stored_event in stored_events if stored_event.partition(count) == index)
+
+    def all_stored_events_between(self, low_stored_event_id, high_stored_event_id):
+        return list(self._stored_events(low_stored_event_id, high_stored_event_id, including_low=True))
+
+    def all_stored_events_since(self, low_stored_event_id, partition=None):
+        return list(self._in_partition(self._stored_events(low_stored_event_id), partition))
+
+    def stream_stored_events_between(self, low_stored_event_id, high_stored_event_id, chunk_size=1000):
+        return self._stored_events(low_stored_event_id, high_stored_event_id, including_low=True)
+
+    def stream_stored_events_since(self, low_stored_event_id, chunk_size=1000, partition=None):
+        return self._in_partition(self._stored_events(low_stored_event_id), partition)
+
+    def append(self, domain_event):
+        stored_event = StoredEvent.from_domain_event(domain_event.type_name, domain_event, self._codec)
+
+        if self._buffered:
+            self._pending_events.append(stored_event)
+        else:
+            self._write([stored_event])
+
+        return stored_event
+
+    def flush(self):
+        if not self._pending_events:
+            return
+
+        stored_events, self._pending_events = self._pending_events, []
+        self._write(stored_events)
+
+    def discard(self):
+        self._pending_events = []
+
+    def close(self):
+        with self._lock:
+            self._sync()
+            self._file.close()
+
+            for segment in self._segments:
+                segment.close()
+
+    def count_stored_events(self):
+        with self._lock:
+            return sum(segment.count for segment in self._segments)
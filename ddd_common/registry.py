@@ -1,3 +1,39 @@
+from ddd_common.port.adapter.messaging.routing import ListenerRouter
+
+
+def _invalidating(name):
+    method = getattr(list, name)
+
+    def invalidating(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self._changed()
+        return result
+
+    invalidating.__name__ = name
+    return invalidating
+
+
+class _ListenerList(list):
+    """List of listeners calling changed whenever it is modified in place."""
+    def __init__(self, listeners, changed):
+        super(_ListenerList, self).__init__(listeners)
+        self._changed = changed
+
+    append = _invalidating('append')
+    extend = _invalidating('extend')
+    insert = _invalidating('insert')
+    remove = _invalidating('remove')
+    pop = _invalidating('pop')
+    sort = _invalidating('sort')
+    reverse = _invalidating('reverse')
+    __setitem__ = _invalidating('__setitem__')
+    __delitem__ = _invalidating('__delitem__')
+    __setslice__ = _invalidating('__setslice__')
+    __delslice__ = _invalidating('__delslice__')
+    __iadd__ = _invalidating('__iadd__')
+    __imul__ = _invalidating('__imul__')
+
+
 class BaseApplication(object):
     def __init__(self, application_registry, domain_registry,
                  infrastructure_registry, listeners):
@@ -6,6 +42,27 @@ class BaseApplication(object):
         self.infrastructure = infrastructure_registry
         self.listeners = listeners
 
+    @property
+    def listeners(self):
+        return self._listeners
+
+    @listeners.setter
+    def listeners(self, listeners):
+        self._listeners = _ListenerList(listeners, self.invalidate_listener_router)
+        self.invalidate_listener_router()
+
+    def invalidate_listener_router(self):
+        """Drops the router, to be used when a listener changed what it listens to."""
+        self._listener_router = None
+
+    @property
+    def listener_router(self):
+        """Router over the listeners, rebuilt after the listeners changed."""
+        if self._listener_router is None:
+            self._listener_router = ListenerRouter(self._listeners)
+
+        return self._listener_router
+
 
 class TestingRegistryMixin(object):
     @property
@@ -13,9 +70,7 @@ class TestingRegistryMixin(object):
         return self.infrastructure.event_store.events
 
     def dispatch(self, exchange, type_name, message):
-        for listener in self.listeners:
-            if listener.can_dispatch(exchange, type_name):
-                listener.dispatch(message)
+        self.listener_router.dispatch(exchange, type_name, message)
 
     @property
     def client(self):
@@ -1,7 +1,7 @@
 from collections import namedtuple
 from hamcrest import assert_that, is_
 import mock
-from ddd_common.application import events, store_all_events
+from ddd_common.application import events, store_all_events, decorated_methods
 from ddd_common.domain.model import publisher
 
 MyEvent = namedtuple('MyEvent', 'value')
@@ -28,4 +28,36 @@ def test_store_all_events():
 
     assert_that(result, is_('new value'))
 
-    event_store.append.assert_called_once_with(MyEvent('value'))
\ No newline at end of file
+    event_store.append.assert_called_once_with(MyEvent('value'))
+
+
+
+class AppendOnlyEventStore(object):
+    def __init__(self):
+        self.events = []
+
+    def append(self, event):
+        self.events.append(event)
+
+
+def test_store_all_events_without_flush_and_discard():
+    delegate = mock.MagicMock(name='delegate')
+    event_store = AppendOnlyEventStore()
+
+    store_all_events(event_store, MyService(delegate)).do_something('value')
+
+    assert_that(event_store.events, is_([MyEvent('value')]))
+
+class MySubService(MyService):
+    @property
+    def value(self):
+        raise AssertionError('properties must not be evaluated')
+
+    @events
+    def do_something_else(self):
+        pass
+
+
+def test_decorated_methods():
+    assert_that(decorated_methods(MySubService, '__store_events__'), is_(('do_something', 'do_something_else')))
+    assert_that(decorated_methods(MySubService, '__transactional__'), is_(()))
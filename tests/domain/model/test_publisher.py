@@ -0,0 +1,66 @@
+from threading import Thread
+from hamcrest import assert_that, is_
+from ddd_common.domain.model import DomainEventPublisher, publisher
+
+
+class MyEvent(object):
+    pass
+
+
+class MySubEvent(MyEvent):
+    pass
+
+
+class OtherEvent(object):
+    pass
+
+
+class Subscriber(object):
+    def __init__(self, subscribed_event_type):
+        self.subscribed_event_type = subscribed_event_type
+        self.events = []
+
+    def handle_event(self, event):
+        self.events.append(event)
+
+
+def test_publish_dispatches_by_event_type():
+    publisher = DomainEventPublisher()
+    all_events = Subscriber(None)
+    my_events = Subscriber(MyEvent)
+    sub_events = Subscriber(MySubEvent)
+
+    for subscriber in [all_events, my_events, sub_events]:
+        publisher.subscribe(subscriber)
+
+    my_event, sub_event, other_event = MyEvent(), MySubEvent(), OtherEvent()
+    publisher.publish(my_event)
+    publisher.publish_all([sub_event, other_event])
+
+    assert_that(all_events.events, is_([my_event, sub_event, other_event]))
+    assert_that(my_events.events, is_([my_event, sub_event]))
+    assert_that(sub_events.events, is_([sub_event]))
+
+
+def test_reset_clears_dispatch_index():
+    publisher = DomainEventPublisher()
+    subscriber = Subscriber(MyEvent)
+    publisher.subscribe(subscriber)
+    publisher.publish(MyEvent())
+
+    publisher.reset()
+    publisher.publish(MyEvent())
+
+    assert_that(len(subscriber.events), is_(1))
+
+
+def test_publisher_is_local():
+    publishers = []
+    threads = [Thread(target=lambda: publishers.append(publisher())) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert_that(publishers[0] is publishers[1], is_(False))
+    assert_that(publisher() is publisher(), is_(True))
@@ -0,0 +1,193 @@
+import threading
+from hamcrest import assert_that, is_
+import mock
+from ddd_common.port.adapter.messaging.dispatch import ConcurrentDispatcher, Acknowledger, BatchCollector, \
+    dispatch_batch, IdempotentListenerMixin, DispatchingConsumer
+from ddd_common.port.adapter.persistence.mock import MockProcessedMessageStore
+
+
+def test_dispatcher_acks_completed_messages_on_complete():
+    dispatcher = ConcurrentDispatcher(2)
+    messages = [mock.MagicMock(name='message %d' % i) for i in range(3)]
+    done = threading.Event()
+
+    for message in messages:
+        dispatcher.submit(lambda: None, [message])
+    dispatcher.submit(done.set, [])
+    done.wait(5)
+    dispatcher.close()
+
+    for message in messages:
+        message.ack.assert_called_once_with()
+
+
+
+def test_dispatcher_acks_succeeded_and_fails_failed_messages_of_an_outcome():
+    ack, failed = mock.MagicMock(name='ack'), mock.MagicMock(name='failed')
+    dispatcher = ConcurrentDispatcher(1, ack=ack, failed=failed)
+
+    dispatcher.submit(lambda: (['message 1', 'message 3'], ['message 2']), ['message 1', 'message 2', 'message 3'])
+    dispatcher.close()
+
+    ack.assert_called_once_with(['message 1', 'message 3'])
+    failed.assert_called_once_with(['message 2'])
+
+def test_ordered_dispatcher_keeps_order_per_key():
+    dispatcher = ConcurrentDispatcher(3, ordered=True)
+    dispatched = {'a': [], 'b': []}
+
+    for i in range(20):
+        for key in ['a', 'b']:
+            dispatcher.submit(lambda key=key, i=i: dispatched[key].append(i), [], key)
+    dispatcher.close()
+
+    assert_that(dispatched, is_({'a': range(20), 'b': range(20)}))
+
+
+def test_dispatcher_reraises_failures():
+    dispatcher = ConcurrentDispatcher(1)
+    message = mock.MagicMock(name='message')
+
+    def fail():
+        raise ValueError('failed')
+
+    dispatcher.submit(fail, [message])
+
+    try:
+        dispatcher.close()
+        assert_that(True, is_(False))
+    except ValueError:
+        pass
+
+    assert_that(message.ack.called, is_(False))
+
+
+def _messages(channel, *delivery_tags):
+    messages = []
+    for delivery_tag in delivery_tags:
+        message = mock.MagicMock(name='message %d' % delivery_tag)
+        message.channel = channel
+        message.delivery_tag = delivery_tag
+        messages.append(message)
+    return messages
+
+
+def test_acknowledger_groups_contiguous_batch_into_multiple_ack():
+    channel = mock.MagicMock(name='channel')
+    acknowledger = Acknowledger()
+    first, second, third, fourth = messages = _messages(channel, 1, 2, 3, 4)
+    for message in messages:
+        acknowledger.delivered(message)
+
+    acknowledger.ack([first, third])
+    first.ack.assert_called_once_with()
+    third.ack.assert_called_once_with()
+
+    acknowledger.ack([second, fourth])
+    channel.basic_ack.assert_called_once_with(4, multiple=True)
+
+
+
+def test_acknowledger_forgets_failed_messages():
+    channel = mock.MagicMock(name='channel')
+    acknowledger = Acknowledger()
+    first, second, third = messages = _messages(channel, 1, 2, 3)
+    for message in messages:
+        acknowledger.delivered(message)
+
+    acknowledger.failed([first])
+    acknowledger.ack([second, third])
+
+    first.requeue.assert_called_once_with()
+    channel.basic_ack.assert_called_once_with(3, multiple=True)
+
+def test_batch_collector():
+    clock = mock.MagicMock(name='clock', return_value=0)
+    batches = BatchCollector(2, 1, clock=clock)
+
+    assert_that(batches.add('listener', 'body 1', 'message 1'), is_(None))
+    assert_that(batches.add('listener', 'body 2', 'message 2'), is_([('body 1', 'message 1'), ('body 2', 'message 2')]))
+
+    batches.add('listener', 'body 3', 'message 3')
+    assert_that(batches.expired(), is_([]))
+
+    clock.return_value = 1
+    assert_that(batches.expired(), is_([('listener', [('body 3', 'message 3')])]))
+
+
+def test_dispatch_batch_falls_back_to_single_dispatch():
+    listener = mock.MagicMock(name='listener', spec=['dispatch_batch', 'dispatch'])
+    listener.dispatch_batch.side_effect = ValueError('failed')
+    listener.dispatch.side_effect = lambda body: None if body != 'body 2' else 1 / 0
+
+    succeeded, failed = dispatch_batch(listener, [('body 1', 'message 1'), ('body 2', 'message 2'),
+                                                  ('body 3', 'message 3')])
+
+    assert_that(listener.dispatch.call_args_list,
+                is_([mock.call('body 1'), mock.call('body 2'), mock.call('body 3')]))
+    assert_that(succeeded, is_(['message 1', 'message 3']))
+    assert_that(failed, is_(['message 2']))
+
+
+def test_dispatching_consumer_requeues_only_failed_messages_of_a_batch():
+    channel = mock.MagicMock(name='channel')
+    messages = _messages(channel, 1, 2, 3)
+    listener = mock.MagicMock(name='listener', spec=['dispatch_batch', 'dispatch'])
+    listener.dispatch_batch.side_effect = ValueError('failed')
+    listener.dispatch.side_effect = lambda body: None if body != 2 else 1 / 0
+
+    consumer = DispatchingConsumer([listener], batch_size=3)
+    for message in messages:
+        consumer._handle_delivery(listener, message.delivery_tag, message)
+
+    first, second, third = messages
+    second.requeue.assert_called_once_with()
+    channel.basic_ack.assert_called_once_with(3, multiple=True)
+    assert_that(first.requeue.called or third.requeue.called, is_(False))
+
+
+class IdempotentListener(IdempotentListenerMixin):
+    def __init__(self, store):
+        self._store = store
+        self.dispatched = []
+
+    @property
+    def processed_message_store(self):
+        return self._store
+
+    def dispatch(self, message):
+        if message == 'fail':
+            raise ValueError(message)
+        self.dispatched.append(message)
+
+
+def _message(message_id):
+    return mock.MagicMock(headers={'message_id': message_id})
+
+
+def test_idempotent_listener_skips_processed_messages():
+    store = MockProcessedMessageStore()
+    listener = IdempotentListener(store)
+
+    listener.dispatch_delivery('a', _message('1'))
+    listener.dispatch_delivery('a', _message('1'))
+    IdempotentListener(store).dispatch_delivery('a', _message('1'))
+    listener.dispatch_delivery('b', _message('2'))
+
+    assert_that(listener.dispatched, is_(['a', 'b']))
+    assert_that(store.processed, is_({(listener.consumer_name, '1'), (listener.consumer_name, '2')}))
+
+
+def test_idempotent_listener_redispatches_failed_messages():
+    store = MockProcessedMessageStore()
+    listener = IdempotentListener(store)
+
+    try:
+        listener.dispatch_delivery('fail', _message('1'))
+        assert_that(True, is_(False))
+    except ValueError:
+        pass
+
+    assert_that(store.processed, is_(set()))
+    listener.dispatch_delivery('a', _message('1'))
+    assert_that(listener.dispatched, is_(['a']))
@@ -0,0 +1,41 @@
+from hamcrest import assert_that, is_
+from ddd_common.port.adapter.messaging.rabbitmq import WorkerConsumer, PooledConnectionFactory
+
+
+def test_worker_consumer_limits_prefetch_of_concurrent_dispatch():
+    consumers = [WorkerConsumer([], max_workers=3), WorkerConsumer([], max_workers=3, batch_size=10),
+                 WorkerConsumer([], prefetch_count=5, max_workers=3), WorkerConsumer([])]
+
+    assert_that([consumer._prefetch_count for consumer in consumers], is_([6, 60, 5, None]))
+
+    for consumer in consumers:
+        consumer.close()
+
+
+def test_pooled_connection_factory_reuses_connections():
+    connection_factory = PooledConnectionFactory('memory://', limit=2)
+
+    try:
+        with connection_factory as connection:
+            channel = connection.default_channel
+            first = connection
+
+        with connection_factory as connection:
+            assert_that(connection is first, is_(True))
+            assert_that(connection.default_channel is channel, is_(True))
+
+        with connection_factory as outer:
+            with connection_factory as inner:
+                assert_that(inner is outer, is_(False))
+
+        try:
+            with connection_factory:
+                raise ValueError('error')
+            assert_that(True, is_(False))
+        except ValueError:
+            pass
+
+        with connection_factory as connection:
+            assert_that(connection.connected, is_(True))
+    finally:
+        connection_factory.close()
@@ -0,0 +1,125 @@
+from collections import defaultdict
+from hamcrest import assert_that, is_
+import mock
+from ddd_common.application.notification import NotificationService
+from ddd_common.event import Event
+from ddd_common.port.adapter.notification.rabbitmq import RabbitMQNotificationPublisher, PublisherConfirms, \
+    shard_tracker_type_name
+from ddd_common.port.adapter.persistence.mock import MockEventStore, MockPublishedNotificationTrackerStore
+
+
+class MyEvent(Event):
+    def __init__(self, value):
+        super(MyEvent, self).__init__()
+        self.value = value
+
+
+def _publisher(event_count, batch_size):
+    event_store = MockEventStore()
+    for value in range(event_count):
+        event_store.append(MyEvent(value))
+
+    tracker_store = MockPublishedNotificationTrackerStore('tracker')
+    connection_factory = mock.MagicMock(name='connection_factory')
+
+    publisher = RabbitMQNotificationPublisher(event_store, tracker_store, mock.MagicMock(name='exchange'),
+                                              connection_factory, batch_size=batch_size)
+    return publisher, tracker_store
+
+
+def test_publish_notifications_checkpoints_every_batch():
+    publisher, tracker_store = _publisher(5, 2)
+
+    assert_that(publisher.publish_notifications(), is_(2))
+    assert_that(tracker_store.published_notification_tracker().most_recent_published_notification_id, is_(2))
+
+    assert_that(publisher.publish_notifications(), is_(2))
+    assert_that(tracker_store.published_notification_tracker().most_recent_published_notification_id, is_(4))
+
+
+def test_drain_notifications():
+    publisher, tracker_store = _publisher(5, 2)
+
+    assert_that(NotificationService(publisher).drain_notifications(), is_(5))
+    assert_that(tracker_store.published_notification_tracker().most_recent_published_notification_id, is_(5))
+
+
+def test_shards_publish_disjoint_partitions_in_order():
+    event_store = MockEventStore()
+    for value in range(20):
+        event = MyEvent(value)
+        event._stream_id = u'stream-%d' % (value % 5)
+        event_store.append(event)
+
+    published = []
+    for index in range(3):
+        shard = (index, 3)
+        tracker_store = MockPublishedNotificationTrackerStore(shard_tracker_type_name('tracker', shard))
+        publisher = RabbitMQNotificationPublisher(event_store, tracker_store, mock.MagicMock(name='exchange'),
+                                                  mock.MagicMock(name='connection_factory'), batch_size=4, shard=shard)
+        publisher._publish = lambda notification, producer, shard=shard: published.append((shard, notification))
+
+        while publisher.publish_notifications():
+            pass
+
+    assert_that(sorted(notification.notification_id for shard, notification in published), is_(range(1, 21)))
+
+    stream_ids = dict((stored_event.event_id, stored_event.stream_id) for stored_event in event_store.all_stored_events_since(0))
+    shards_of_stream = defaultdict(set)
+    ids_of_shard = defaultdict(list)
+    for shard, notification in published:
+        shards_of_stream[stream_ids[notification.notification_id]].add(shard)
+        ids_of_shard[shard].append(notification.notification_id)
+
+    assert_that(all(len(shards) == 1 for shards in shards_of_stream.values()), is_(True))
+    assert_that(all(ids == sorted(ids) for ids in ids_of_shard.values()), is_(True))
+
+
+def test_publisher_confirms_track_highest_contiguous_ack():
+    channel = mock.MagicMock(name='channel')
+    channel.events = defaultdict(set)
+    confirms = PublisherConfirms(channel)
+
+    for notification in range(1, 6):
+        confirms.published(notification)
+
+    [on_ack] = channel.events['basic_ack']
+    [on_nack] = channel.events['basic_nack']
+
+    on_ack(1, False)
+    on_ack(3, False)
+    assert_that(confirms.confirmed, is_([1]))
+
+    on_ack(2, False)
+    assert_that(confirms.confirmed, is_([1, 2, 3]))
+
+    on_nack(4, False, False)
+    on_ack(5, True)
+    assert_that(confirms.confirmed, is_([1, 2, 3]))
+    assert_that(confirms.all_resolved, is_(True))
+    assert_that(confirms.all_confirmed, is_(False))
+
+
+def test_publisher_confirms_wait_for_timeout_in_total():
+    channel = mock.MagicMock(name='channel')
+    channel.events = defaultdict(set)
+    confirms = PublisherConfirms(channel)
+    for notification in range(1, 6):
+        confirms.published(notification)
+    [on_ack] = channel.events['basic_ack']
+
+    now = [0]
+    timeouts = []
+
+    def drain_events(timeout):
+        timeouts.append(timeout)
+        now[0] += 4
+        on_ack(len(timeouts), False)
+
+    connection = mock.MagicMock(name='connection')
+    connection.drain_events.side_effect = drain_events
+
+    confirms.wait(connection, 10, clock=lambda: now[0])
+
+    assert_that(timeouts, is_([10, 6, 2]))
+    assert_that(confirms.confirmed, is_([1, 2, 3]))
@@ -0,0 +1,79 @@
+from hamcrest import assert_that, is_
+from ddd_common.application.decoratos import EventStoreSubscriber
+from ddd_common.domain.model import EventSourcedEntity, PublisherLifecycle, publisher
+from ddd_common.event import Event
+from ddd_common.port.adapter.persistence.eventsourcing import EventSourcedRepository
+from ddd_common.port.adapter.persistence.mock import MockEventStore, MockSnapshotStore
+
+
+class CounterCreated(Event):
+    def __init__(self, start):
+        super(CounterCreated, self).__init__()
+        self.start = start
+
+
+class CounterIncremented(Event):
+    def __init__(self, by):
+        super(CounterIncremented, self).__init__()
+        self.by = by
+
+
+class Counter(EventSourcedEntity):
+    def _initialize(self, start):
+        self._apply(CounterCreated(start))
+
+    @property
+    def value(self):
+        return self._value
+
+    def increment(self, by):
+        self._apply(CounterIncremented(by))
+
+    def _when_CounterCreated(self, event):
+        self._value = event.start
+
+    def _when_CounterIncremented(self, event):
+        self._value += event.by
+
+    def _snapshot_state(self):
+        return {'value': self._value}
+
+    def _restore_state(self, state):
+        self._value = state['value']
+
+
+class CounterRepository(EventSourcedRepository):
+    _entity_class = Counter
+    _event_classes = [CounterCreated, CounterIncremented]
+
+    def counter_of_id(self, id):
+        return self._object_of_id(id)
+
+
+def test_load_from_snapshot_and_stream_tail():
+    event_store = MockEventStore()
+    snapshot_store = MockSnapshotStore()
+    repository = CounterRepository(event_store, snapshot_store, snapshot_every=2)
+
+    with PublisherLifecycle(publisher(), EventStoreSubscriber(event_store)):
+        counter = Counter(1, 10)
+        counter.increment(1)
+        repository.save(counter)
+        counter.increment(2)
+        repository.save(counter)
+
+    assert_that(snapshot_store.snapshot_of(u'1').stream_version, is_(2))
+
+    loaded = repository.counter_of_id(1)
+
+    assert_that(loaded.value, is_(13))
+    assert_that(loaded.version, is_(3))
+    assert_that(repository.counter_of_id(2), is_(None))
+
+
+def test_snapshot_every_needs_a_snapshot_store():
+    try:
+        CounterRepository(MockEventStore(), snapshot_every=10)
+        assert_that(True, is_(False))
+    except ValueError:
+        pass
@@ -0,0 +1,33 @@
+from hamcrest import assert_that, is_
+import mock
+import sqlalchemy as sa
+from ddd_common.port.adapter.persistence.ids import HiLoIdAllocator, PooledIdAllocator, UuidIdAllocator
+
+
+def _session(*sequence_values):
+    session = mock.MagicMock(name='session')
+    session.execute.return_value.fetchone.side_effect = [[value] for value in sequence_values]
+    return session
+
+
+def test_hilo_id_allocator():
+    session = _session(1, 2)
+    allocator = HiLoIdAllocator(3)
+    sequence = sa.Sequence('my_sequence')
+
+    assert_that([allocator.next_id(session, sequence) for _ in range(5)], is_([3, 4, 5, 6, 7]))
+    assert_that(session.execute.call_count, is_(2))
+
+
+def test_pooled_id_allocator():
+    session = _session(1, 11)
+    allocator = PooledIdAllocator(10)
+    sequence = sa.Sequence('my_sequence')
+
+    assert_that([allocator.next_id(session, sequence) for _ in range(12)], is_(range(1, 13)))
+
+
+def test_uuid_id_allocator():
+    allocator = UuidIdAllocator()
+
+    assert_that(allocator.next_id(None, None) != allocator.next_id(None, None), is_(True))
@@ -0,0 +1,48 @@
+from datetime import datetime
+from hamcrest import assert_that, is_
+from ddd_common import fullname
+from ddd_common.event import Event
+from ddd_common.port.adapter.persistence.mock import MockEventStore
+
+
+class MyEvent(Event):
+    pass
+
+
+class OtherEvent(Event):
+    pass
+
+
+def _event_ids(stored_events):
+    return [stored_event.event_id for stored_event in stored_events]
+
+
+def test_range_queries():
+    event_store = MockEventStore()
+    for _ in range(5):
+        event_store.append(MyEvent())
+
+    assert_that(_event_ids(event_store.all_stored_events_since(None)), is_([1, 2, 3, 4, 5]))
+    assert_that(_event_ids(event_store.all_stored_events_since(3)), is_([4, 5]))
+    assert_that(_event_ids(event_store.all_stored_events_since(5)), is_([]))
+    assert_that(_event_ids(event_store.all_stored_events_between(2, 4)), is_([2, 3, 4]))
+    assert_that(_event_ids(event_store.stream_stored_events_between(0, 2)), is_([1, 2]))
+    assert_that(_event_ids(event_store.stream_stored_events_since(4)), is_([5]))
+    assert_that(_event_ids(event_store.all_stored_events_between(None, 2)), is_([1, 2]))
+    assert_that(_event_ids(event_store.stream_stored_events_between(None, 1)), is_([1]))
+
+
+def test_type_and_time_queries():
+    event_store = MockEventStore()
+    for day in [3, 1, 2, 5, 4]:
+        event = MyEvent() if day % 2 else OtherEvent()
+        event.occured_on = datetime(2015, 1, day)
+        event_store.append(event)
+
+    my_event, other_event = fullname(MyEvent()), fullname(OtherEvent())
+
+    assert_that(_event_ids(event_store.all_stored_events_of_types_since([my_event], 1)), is_([2, 4]))
+    assert_that(_event_ids(event_store.all_stored_events_of_types_since([my_event, other_event], None)),
+                is_([1, 2, 3, 4, 5]))
+    assert_that(_event_ids(event_store.all_stored_events_occured_between(datetime(2015, 1, 2), datetime(2015, 1, 4))),
+                is_([3, 1, 5]))
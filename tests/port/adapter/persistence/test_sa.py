@@ -1,7 +1,19 @@
+from datetime import datetime
 from hamcrest import assert_that, is_
 import mock
+import sqlalchemy as sa
+import sqlalchemy.dialects.postgresql
+import sqlalchemy.orm
 from ddd_common.application import transactional
-from ddd_common.port.adapter.persistence.sa import wrap_object_in_transaction
+from ddd_common.cache import LruCache
+from ddd_common.domain.model import Entity
+from ddd_common.event import Event
+from ddd_common.notification import Notification, NotificationReader
+from ddd_common.port.adapter.messaging.dispatch import IdempotentListenerMixin
+from ddd_common.port.adapter.persistence import mapping
+from ddd_common.port.adapter.persistence.mapping import create_schema
+from ddd_common.port.adapter.persistence.sa import wrap_object_in_transaction, SaEventStore, SaRepository, \
+    SaProcessedMessageStore, _invalidate_stale_objects
 
 
 class MyService(object):
@@ -40,4 +52,325 @@ def test_wrap_object_in_transaction_rollback():
     except Exception:
         pass
 
-    session.rollback.assert_called_once_with()
\ No newline at end of file
+    session.rollback.assert_called_once_with()
+
+class MyEvent(Event):
+    type_name = 'my_event'
+
+    def __init__(self, value):
+        super(MyEvent, self).__init__()
+        self.value = value
+
+
+def _event_ids(stored_events):
+    return [stored_event.event_id for stored_event in stored_events]
+
+
+def _session():
+    engine = sa.create_engine('sqlite://')
+    create_schema(engine)
+    return sa.orm.sessionmaker(bind=engine)()
+
+
+def test_buffered_event_store_assigns_ids_on_flush():
+    session = _session()
+    event_store = SaEventStore(session, buffered=True)
+
+    stored_events = [event_store.append(MyEvent(value)) for value in range(3)]
+    assert_that(event_store.count_stored_events(), is_(0))
+
+    event_store.flush()
+
+    assert_that([stored_event.event_id for stored_event in stored_events], is_([1, 2, 3]))
+    assert_that([stored_event.event_id for stored_event in event_store.all_stored_events_since(None)],
+                is_([1, 2, 3]))
+
+
+def test_buffered_event_store_flushes_with_one_insert_returning_on_postgresql():
+    dialect = sa.dialects.postgresql.dialect(implicit_returning=True)
+    session = mock.MagicMock(name='session')
+    session.get_bind.return_value.dialect = dialect
+    session.execute.return_value = [[12], [10], [11]]
+    event_store = SaEventStore(session, buffered=True)
+
+    stored_events = [event_store.append(MyEvent(value)) for value in range(3)]
+    event_store.flush()
+
+    assert_that(session.execute.call_count, is_(1))
+    [statement], _ = session.execute.call_args
+    sql = str(statement.compile(dialect=dialect))
+    assert_that(sql.count('INSERT INTO'), is_(1))
+    assert_that(sql.count('%(type_name_m'), is_(3))
+    assert_that(sql.endswith('RETURNING stored_events.event_id'), is_(True))
+    assert_that(_event_ids(stored_events), is_([10, 11, 12]))
+
+
+def test_stream_stored_events_pages_by_event_id():
+    session = _session()
+    event_store = SaEventStore(session)
+
+    for value in range(5):
+        event_store.append(MyEvent(value))
+
+    assert_that([stored_event.event_id for stored_event in event_store.stream_stored_events_since(None, chunk_size=2)],
+                is_([1, 2, 3, 4, 5]))
+    assert_that([stored_event.event_id for stored_event in event_store.stream_stored_events_since(1, chunk_size=2)],
+                is_([2, 3, 4, 5]))
+    assert_that([stored_event.event_id for stored_event in event_store.stream_stored_events_between(2, 4, chunk_size=2)],
+                is_([2, 3, 4]))
+
+
+def test_stored_events_of_stream():
+    session = _session()
+    event_store = SaEventStore(session, buffered=True)
+
+    for version, stream_id in enumerate([u'a', u'b', u'a', u'a'], 1):
+        event = MyEvent(version)
+        event._stream_id = stream_id
+        event._stream_version = version
+        event_store.append(event)
+    event_store.flush()
+
+    assert_that([stored_event.stream_version for stored_event in event_store.stored_events_of_stream(u'a', 1)],
+                is_([3, 4]))
+
+
+class MyEntity(Entity):
+    def _initialize(self, name):
+        self.name = name
+
+
+my_entities_metadata = sa.MetaData()
+my_entities = sa.Table(
+    'my_entities',
+    my_entities_metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('name', sa.String)
+)
+sa.orm.mapper(MyEntity, my_entities, properties={'_id': my_entities.c.id})
+
+
+class MyEntityRepository(SaRepository):
+    _entity_class = MyEntity
+    _table = my_entities
+    _cache = LruCache(max_size=10)
+
+    def entity_of_id(self, id):
+        return self._object_of_id(id)
+
+    def entities_of_ids(self, ids):
+        return self._objects_of_ids(ids)
+
+
+class QueryCounter(object):
+    def __init__(self, engine):
+        self.count = 0
+        sa.event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def _entity_session():
+    engine = sa.create_engine('sqlite://')
+    my_entities_metadata.create_all(engine)
+    return sa.orm.sessionmaker(bind=engine), QueryCounter(engine)
+
+
+def test_object_of_id_uses_identity_map_and_cache():
+    MyEntityRepository._cache.clear()
+    session_factory, queries = _entity_session()
+
+    session = session_factory()
+    session.add(MyEntity(1, 'first'))
+    session.commit()
+    session.close()
+    queries.count = 0
+
+    session = session_factory()
+    repository = MyEntityRepository(session)
+    assert_that(repository.entity_of_id(1).name, is_('first'))
+    assert_that(repository.entity_of_id(1).name, is_('first'))
+    assert_that(queries.count, is_(1))
+    session.close()
+
+    session = session_factory()
+    repository = MyEntityRepository(session)
+    entity = repository.entity_of_id(1)
+    assert_that(entity.name, is_('first'))
+    assert_that(queries.count, is_(1))
+
+    entity.name = 'second'
+    repository.save(entity)
+    session.commit()
+    session.close()
+
+    session = session_factory()
+    assert_that(MyEntityRepository(session).entity_of_id(1).name, is_('second'))
+
+
+
+def test_cache_is_invalidated_on_commit_without_save():
+    MyEntityRepository._cache.clear()
+    session_factory, queries = _entity_session()
+
+    session = session_factory()
+    session.add(MyEntity(1, 'first'))
+    session.commit()
+    session.close()
+
+    session = session_factory()
+    entity = MyEntityRepository(session).entity_of_id(1)
+    entity.name = 'second'
+
+    reader = session_factory()
+    assert_that(MyEntityRepository(reader).entity_of_id(1).name, is_('first'))
+    reader.close()
+
+    session.commit()
+    session.close()
+
+    session = session_factory()
+    assert_that(MyEntityRepository(session).entity_of_id(1).name, is_('second'))
+
+
+def test_cache_invalidation_with_scoped_sessions():
+    MyEntityRepository._cache.clear()
+    session_factory, queries = _entity_session()
+    scoped = sa.orm.scoped_session(session_factory)
+
+    for name in ['first', 'second', 'third']:
+        repository = MyEntityRepository(scoped)
+        entity = repository.entity_of_id(1)
+        if entity is None:
+            scoped.add(MyEntity(1, name))
+        else:
+            entity.name = name
+        scoped.commit()
+        scoped.remove()
+
+    other = session_factory()
+    other.add(MyEntity(2, 'other'))
+    other.commit()
+
+    assert_that(MyEntityRepository(scoped).entity_of_id(1).name, is_('third'))
+    assert_that(sa.event.contains(session_factory, 'after_commit', _invalidate_stale_objects), is_(False))
+
+def test_objects_of_ids_loads_in_chunks():
+    MyEntityRepository._cache.clear()
+    session_factory, queries = _entity_session()
+
+    session = session_factory()
+    session.add_all([MyEntity(id, 'entity %d' % id) for id in range(1, 6)])
+    session.commit()
+    session.close()
+
+    session = session_factory()
+    repository = MyEntityRepository(session)
+    repository._max_ids_per_query = 2
+    session.query(MyEntity).get(5)
+    queries.count = 0
+
+    entities = repository.entities_of_ids([3, 1, 7, 5, 2, 4])
+
+    assert_that([entity.id if entity is not None else None for entity in entities], is_([3, 1, None, 5, 2, 4]))
+    assert_that(queries.count, is_(3))
+
+
+def test_processed_message_marks_follow_the_transaction():
+    session = _session()
+    store = SaProcessedMessageStore(session)
+
+    store.mark_processed('consumer', '1')
+    session.rollback()
+    assert_that(store.is_processed('consumer', '1'), is_(False))
+
+    store.mark_processed('consumer', '1')
+    store.mark_processed('consumer', '2')
+    store.discard_processed('consumer', '2')
+    session.commit()
+
+    assert_that(store.is_processed('consumer', '1'), is_(True))
+    assert_that(store.is_processed('consumer', '2'), is_(False))
+    assert_that(store.is_processed('other', '1'), is_(False))
+
+
+class QueryingListener(IdempotentListenerMixin):
+    def __init__(self, session):
+        self._session = session
+
+    @property
+    def processed_message_store(self):
+        return SaProcessedMessageStore(self._session)
+
+    def dispatch(self, message):
+        self._session.query(mapping.ProcessedMessage).all()
+        raise ValueError(message)
+
+
+def test_processed_message_mark_is_discarded_when_handler_queries_and_fails():
+    session = _session()
+    listener = QueryingListener(session)
+
+    try:
+        listener.dispatch_delivery('message', mock.MagicMock(headers={'message_id': '1'}))
+        assert_that(True, is_(False))
+    except ValueError:
+        pass
+    session.commit()
+
+    assert_that(listener.processed_message_store.is_processed(listener.consumer_name, '1'), is_(False))
+
+
+def test_event_store_partitions():
+    session = _session()
+    event_store = SaEventStore(session)
+
+    for value in range(10):
+        event = MyEvent(value)
+        event._stream_id = u'stream-%d' % value
+        event_store.append(event)
+    session.execute(mapping.stored_events.insert(), dict(type_name='legacy', occured_on=datetime.now(), event_body='{}'))
+
+    partitions = [[stored_event.event_id for stored_event in event_store.stream_stored_events_since(0, 3, partition=(index, 2))]
+                  for index in range(2)]
+
+    assert_that(sorted(partitions[0] + partitions[1]), is_(range(1, 12)))
+    assert_that(11 in partitions[0], is_(True))
+    assert_that([stored_event.event_id for stored_event in event_store.all_stored_events_since(0, partition=(1, 2))],
+                is_(partitions[1]))
+
+
+def test_event_store_compression():
+    session = _session()
+    event_store = SaEventStore(session, compression='zlib')
+    event_store.append(MyEvent('compressed'))
+    SaEventStore(session).append(MyEvent('legacy'))
+    session.commit()
+    session.expunge_all()
+
+    compressed, legacy = event_store.all_stored_events_since(0)
+
+    assert_that(compressed.encoding, is_('zlib'))
+    assert_that(session.execute(sa.select([mapping.stored_events.c.event_body])).fetchall()[0][0], is_(None))
+    assert_that(Notification.from_stored_event(compressed.event_id, compressed).event, is_(compressed.event))
+    assert_that(NotificationReader(compressed.event).string('value'), is_('compressed'))
+    assert_that(legacy.encoding, is_(None))
+    assert_that(NotificationReader(legacy.event).string('value'), is_('legacy'))
+
+
+def test_event_store_type_and_time_queries():
+    session = _session()
+    event_store = SaEventStore(session)
+
+    for day in [3, 1, 2]:
+        event = MyEvent(day)
+        event.occured_on = datetime(2015, 1, day)
+        event_store.append(event)
+    session.execute(mapping.stored_events.insert(), dict(type_name='other', occured_on=datetime(2015, 1, 2), event_body='{}'))
+
+    assert_that(_event_ids(event_store.all_stored_events_of_types_since(['my_event'], 1)), is_([2, 3]))
+    assert_that(_event_ids(event_store.stream_stored_events_of_types_since(['my_event', 'other'], None, 2)),
+                is_([1, 2, 3, 4]))
+    assert_that(_event_ids(event_store.all_stored_events_occured_between(datetime(2015, 1, 2), datetime(2015, 1, 3))),
+                is_([3, 4, 1]))
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+from hamcrest import assert_that, is_
+import simplejson
+from ddd_common.event import Event
+from ddd_common.port.adapter.persistence.segments import SegmentEventStore, CorruptSegmentError
+
+
+class MyEvent(Event):
+    type_name = 'my_event'
+
+    def __init__(self, value):
+        super(MyEvent, self).__init__()
+        self.value = value
+
+
+def _event_ids(stored_events):
+    return [stored_event.event_id for stored_event in stored_events]
+
+
+def test_segment_event_store():
+    directory = tempfile.mkdtemp()
+    try:
+        event_store = SegmentEventStore(directory, segment_size=512, index_interval=3)
+        for value in range(30):
+            event_store.append(MyEvent(value))
+
+        assert_that(len(os.listdir(directory)) > 1, is_(True))
+        assert_that(event_store.count_stored_events(), is_(30))
+        assert_that(_event_ids(event_store.all_stored_events_between(5, 17)), is_(range(5, 18)))
+        assert_that(_event_ids(event_store.all_stored_events_since(25)), is_(range(26, 31)))
+        assert_that(_event_ids(event_store.all_stored_events_between(None, 2)), is_([1, 2]))
+        assert_that(_event_ids(event_store.stream_stored_events_since(None)), is_(range(1, 31)))
+
+        stored_event = event_store.all_stored_events_between(7, 7)[0]
+        assert_that(stored_event.type_name, is_('my_event'))
+        assert_that(simplejson.loads(stored_event.event)['value'], is_(6))
+        event_store.close()
+
+        last_segment = os.path.join(directory, sorted(os.listdir(directory))[-1])
+        with open(last_segment, 'ab') as f:
+            f.write('torn')
+
+        event_store = SegmentEventStore(directory, segment_size=512, buffered=True)
+        assert_that(event_store.count_stored_events(), is_(30))
+
+        event_store.append(MyEvent(30))
+        event_store.discard()
+        event_store.append(MyEvent(31))
+        event_store.flush()
+
+        assert_that(_event_ids(event_store.all_stored_events_since(29)), is_([30, 31]))
+        event_store.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_corrupt_sealed_segment_raises():
+    directory = tempfile.mkdtemp()
+    try:
+        event_store = SegmentEventStore(directory, segment_size=512)
+        for value in range(30):
+            event_store.append(MyEvent(value))
+        event_store.close()
+
+        first_segment = os.path.join(directory, sorted(os.listdir(directory))[0])
+        with open(first_segment, 'r+b') as f:
+            f.seek(30)
+            byte = f.read(1)
+            f.seek(30)
+            f.write(chr(ord(byte) ^ 0xff))
+
+        try:
+            SegmentEventStore(directory, segment_size=512)
+            assert_that(True, is_(False))
+        except CorruptSegmentError:
+            pass
+
+        assert_that(os.path.getsize(first_segment) > 30, is_(True))
+    finally:
+        shutil.rmtree(directory)
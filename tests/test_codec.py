@@ -0,0 +1,52 @@
+from datetime import date, datetime
+import uuid
+from hamcrest import assert_that, is_
+from nose import SkipTest
+from ddd_common.codec import get_codec, ujson
+from ddd_common.event import serialize_event, Event
+from ddd_common.notification import NotificationReader
+
+
+class MyEvent(Event):
+    def __init__(self, value):
+        super(MyEvent, self).__init__()
+        self.value = value
+        self.on_datetime = datetime(2010, 1, 1, 12, 30)
+        self.on_date = date(2010, 1, 1)
+        self.nested = {'values': (1, 2)}
+
+
+def test_codecs_write_the_same_json():
+    if ujson is None:
+        raise SkipTest('ujson is not installed')
+
+    event = MyEvent('value')
+
+    json = serialize_event(event, 'json')
+    fast_json = serialize_event(event, 'ujson')
+
+    assert_that(get_codec('ujson').loads(json), is_(get_codec('json').loads(fast_json)))
+    assert_that(NotificationReader(fast_json, 'ujson').datetime('on_datetime'), is_(datetime(2010, 1, 1, 12, 30)))
+
+
+def test_ujson_keeps_15_significant_digits_of_floats():
+    if ujson is None:
+        raise SkipTest('ujson is not installed')
+
+    value = 1.2345678901234567
+
+    decoded = get_codec('ujson').loads(get_codec('ujson').dumps({'value': value}))['value']
+
+    assert_that(abs(decoded - value) < 1e-14, is_(True))
+
+
+def test_codecs_reject_the_same_unsupported_values():
+    codecs = ['json', 'ujson'] if ujson is not None else ['json']
+
+    for name in codecs:
+        for value in [uuid.uuid4(), set([1])]:
+            try:
+                get_codec(name).dumps({'value': value})
+                assert_that(True, is_(False))
+            except TypeError:
+                pass
@@ -0,0 +1,12 @@
+from hamcrest import assert_that, is_
+from ddd_common.compression import get_compression
+
+
+def test_zlib_compression():
+    compression = get_compression('zlib')
+    data = '{"value": 1, "occured_on": "2015-01-01 10:00:00"}' * 10
+
+    compressed = compression.compress(data)
+
+    assert_that(len(compressed) < len(data), is_(True))
+    assert_that(compression.decompress(compressed), is_(data))
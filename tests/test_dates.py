@@ -0,0 +1,28 @@
+from datetime import date, datetime
+from hamcrest import assert_that, is_
+from ddd_common.dates import format_datetime, format_date, parse_datetime, parse_date, FixedOffset, UTC
+
+
+def test_format_matches_strftime():
+    value = datetime(2010, 1, 2, 3, 4, 5, 678)
+
+    assert_that(format_datetime(value), is_(value.strftime('%Y-%m-%d %H:%M:%S')))
+    assert_that(format_date(value.date()), is_(value.strftime('%Y-%m-%d')))
+
+
+def test_parse_datetime():
+    assert_that(parse_datetime('2010-01-02 03:04:05'), is_(datetime(2010, 1, 2, 3, 4, 5)))
+    assert_that(parse_datetime('2010-01-02T03:04:05.5'), is_(datetime(2010, 1, 2, 3, 4, 5, 500000)))
+    assert_that(parse_datetime('2010-01-02 03:04:05Z'), is_(datetime(2010, 1, 2, 3, 4, 5, tzinfo=UTC)))
+    assert_that(parse_datetime('2010-01-02 03:04:05.000001-01:30'),
+                is_(datetime(2010, 1, 2, 3, 4, 5, 1, tzinfo=FixedOffset(-90))))
+    assert_that(parse_date('2010-01-02'), is_(date(2010, 1, 2)))
+
+
+def test_round_trip_with_precision():
+    value = datetime(2010, 1, 2, 3, 4, 5, 678, tzinfo=FixedOffset(120))
+
+    text = format_datetime(value, microseconds=True, timezone=True)
+
+    assert_that(text, is_('2010-01-02 03:04:05.000678+02:00'))
+    assert_that(parse_datetime(text), is_(value))
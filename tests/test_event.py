@@ -0,0 +1,78 @@
+from datetime import datetime
+from hamcrest import assert_that, is_
+from ddd_common.event import Event, StoredEvent
+
+
+def to_json_by_reflection(event):
+    return {key: getattr(event, key) for key in dir(event) if not key.startswith('_') and not callable(getattr(event, key))}
+
+
+class MyEvent(Event):
+    type_name = 'my_event'
+
+    def __init__(self, value, optional=None):
+        super(MyEvent, self).__init__()
+        self.value = value
+        self._private = 'private'
+        if optional is not None:
+            self.optional = optional
+
+    @property
+    def doubled(self):
+        return self.value * 2
+
+    def method(self):
+        pass
+
+
+class MySlotsEvent(Event):
+    __slots__ = ('slot', 'unset_slot')
+
+    def __init__(self, slot):
+        super(MySlotsEvent, self).__init__()
+        self.slot = slot
+
+
+class MyDeclaredEvent(Event):
+    __event_fields__ = ('value', 'occured_on')
+
+    def __init__(self, value):
+        super(MyDeclaredEvent, self).__init__()
+        self.value = value
+        self.ignored = 'ignored'
+
+
+def test_to_json_matches_reflection():
+    for event in [MyEvent(1), MyEvent(2, optional='optional'), MyEvent(3)]:
+        assert_that(event.to_json(), is_(to_json_by_reflection(event)))
+
+
+def test_to_json_with_slots():
+    event = MySlotsEvent('slot')
+
+    assert_that(event.to_json(), is_({'slot': 'slot', 'event_version': 1, 'occured_on': event.occured_on}))
+
+
+def test_to_json_with_declared_fields():
+    event = MyDeclaredEvent('value')
+    event.occured_on = datetime(2010, 1, 1)
+
+    assert_that(event.to_json(), is_({'value': 'value', 'occured_on': datetime(2010, 1, 1)}))
+
+
+class OrderPlaced(Event):
+    def __init__(self, order_id):
+        super(OrderPlaced, self).__init__()
+        self._partition_key = order_id
+
+
+class OrderCancelled(OrderPlaced):
+    pass
+
+
+def test_events_of_one_aggregate_share_a_partition():
+    placed = StoredEvent.from_domain_event('order_placed', OrderPlaced(7), 'json')
+    cancelled = StoredEvent.from_domain_event('order_cancelled', OrderCancelled(7), 'json')
+
+    assert_that(placed.partition_hash, is_(cancelled.partition_hash))
+    assert_that('_partition_key' in placed.event, is_(False))
@@ -33,4 +33,14 @@ def test_notification_reader():
     assert_that(reader.bool('param5_bool'), is_(True))
     assert_that(reader.string('param5_bool'), is_('true'))
 
-    assert_that(reader.int('complex.param'), is_(1))
\ No newline at end of file
+    assert_that(reader.int('complex.param'), is_(1))
+
+def test_notification_reader_extract():
+    json = serialize_event(
+        MyEvent('value1', 1, datetime(2010, 1, 1), date(2010, 1, 1), True, {'param':1}))
+
+    reader = NotificationReader(json)
+
+    assert_that(reader.extract(('string', 'param1_str'), ('int', 'complex.param'), ('bool', 'param5_bool')),
+                is_(['value1', 1, True]))
+    assert_that(reader.contains('complex.missing'), is_(False))
@@ -0,0 +1,71 @@
+from hamcrest import assert_that, is_
+import mock
+from ddd_common.registry import BaseApplication, TestingRegistryMixin
+
+
+class MyEvent(object):
+    type_name = 'my_event'
+
+
+class Listener(object):
+    def __init__(self, exchange_name, listens_to):
+        self.exchange_name = exchange_name
+        self.listens_to = listens_to
+        self.messages = []
+
+    def dispatch(self, message):
+        self.messages.append(message)
+
+
+class MyApplication(TestingRegistryMixin, BaseApplication):
+    pass
+
+
+def test_dispatch_routes_by_exchange_and_type_name():
+    first = Listener('exchange', [MyEvent, 'other_event'])
+    second = Listener('exchange', ['my_event'])
+    third = Listener('other_exchange', ['my_event'])
+    application = MyApplication(mock.MagicMock(), mock.MagicMock(), mock.MagicMock(), [first, second, third])
+
+    application.dispatch('exchange', 'my_event', 'message')
+
+    assert_that(first.messages, is_(['message']))
+    assert_that(second.messages, is_(['message']))
+    assert_that(third.messages, is_([]))
+
+    application.listeners = [third]
+    application.dispatch('other_exchange', 'my_event', 'message')
+
+    assert_that(third.messages, is_(['message']))
+
+    application.listeners.append(first)
+    application.dispatch('exchange', 'other_event', 'other message')
+
+    assert_that(first.messages, is_(['message', 'other message']))
+
+    del application.listeners[0]
+    application.dispatch('other_exchange', 'my_event', 'message')
+
+    assert_that(third.messages, is_(['message']))
+
+    application.listeners[0:0] = [second]
+    application.dispatch('exchange', 'my_event', 'message')
+
+    assert_that(second.messages, is_(['message', 'message']))
+
+
+class PrefixListener(Listener):
+    def can_dispatch(self, exchange, type_name):
+        return exchange == self.exchange_name and type_name.startswith(self.listens_to)
+
+
+def test_dispatch_asks_listeners_overriding_can_dispatch():
+    prefix = PrefixListener('exchange', 'my_')
+    listener = Listener('exchange', ['my_event'])
+    application = MyApplication(mock.MagicMock(), mock.MagicMock(), mock.MagicMock(), [prefix, listener])
+
+    application.dispatch('exchange', 'my_event', 'message')
+    application.dispatch('exchange', 'my_other_event', 'other message')
+
+    assert_that(prefix.messages, is_(['message', 'other message']))
+    assert_that(listener.messages, is_(['message']))